@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+FORECAST_YEARS = 3
+TREND_WINDOW = 5  # most recent years with data used to fit each trend
+
+
+def yoy_growth(years, values, present):
+    # Year-over-year growth along axis 0; NaN where the prior year is missing, absent or zero
+    growth = np.full(values.shape, np.nan)
+    if len(years) < 2:
+        return growth
+    prev, cur = values[:-1], values[1:]
+    consecutive = (np.diff(years) == 1).reshape((-1,) + (1,) * (values.ndim - 1))
+    valid = consecutive & present[:-1] & present[1:] & (prev != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth[1:] = np.where(valid, (cur - prev) / prev, np.nan)
+    return growth
+
+
+def trend_forecast(years, values, present, horizon=FORECAST_YEARS, window=TREND_WINDOW):
+    # Least-squares linear trend per series (axis 0 is time) over each series' last `window`
+    # populated years, projected `horizon` years past the last year; clipped at zero.
+    # Returns (future_years, forecasts of shape (horizon,) + values.shape[1:]).
+    future = (years[-1] + np.arange(1, horizon + 1)) if len(years) else np.empty(0, dtype=np.int64)
+    shape = (horizon,) + values.shape[1:]
+    if len(years) == 0:
+        return future, np.full(shape, np.nan)
+    # Rank populated years from the most recent backwards; keep the last `window`
+    rank = np.cumsum(present[::-1], axis=0)[::-1]
+    w = (present & (rank <= window)).astype(np.float64)
+    x = (years - years[-1]).astype(np.float64).reshape((-1,) + (1,) * (values.ndim - 1))
+    y = np.where(present, values, 0.0)
+    sw, sx, sy = w.sum(axis=0), (w * x).sum(axis=0), (w * y).sum(axis=0)
+    sxx, sxy = (w * x * x).sum(axis=0), (w * x * y).sum(axis=0)
+    denom = sw * sxx - sx * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denom > 0, (sw * sxy - sx * sy) / denom, 0.0)
+        intercept = np.where(sw > 0, (sy - slope * sx) / sw, np.nan)
+    steps = np.arange(1, horizon + 1, dtype=np.float64).reshape((-1,) + (1,) * (values.ndim - 1))
+    forecast = np.maximum(intercept + slope * steps, 0.0)
+    return future, np.where(sw >= 2, forecast, np.nan)
+
+
+def hhi(values, axis):
+    # Herfindahl-Hirschman index (0-10000) of the shares along `axis`; NaN where the total is 0
+    totals = values.sum(axis=axis, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = values / totals
+        index = (shares * shares).sum(axis=axis) * 10000
+    return np.where(np.squeeze(totals, axis=axis) > 0, index, np.nan)
+
+
+# Derived production metrics for one data snapshot: production value from mineral prices,
+# year-over-year growth, linear trend forecasts and country concentration (HHI). Built in one
+# vectorized pass over the ProductionCube arrays, so the cost depends on the number of
+# (year, mineral, country) cells rather than the number of production rows, and is paid once
+# per data version. Series are addressed by (mineral position, country position) like the cube.
+class Analytics:
+    def __init__(self, cube, minerals, horizon=FORECAST_YEARS, window=TREND_WINDOW):
+        self.cube = cube
+        self.minerals = minerals
+        self.years = cube.years
+        self.prices = self._prices(cube, minerals)
+        self.horizon, self.window = horizon, window
+        tonnes = cube.by_year_mineral['Production_tonnes']  # (Y, M) rollups kept by the cube
+        prices = np.nan_to_num(self.prices)
+        # Series per level, time on axis 0: total (Y,), mineral (Y, M), country (Y, C).
+        # Single (mineral, country) series are derived on demand from the cube's cells.
+        by_mineral_value = tonnes * prices
+        by_country_value = np.einsum('ymc,m->yc', cube.cells['Production_tonnes'], prices)
+        self.levels = {
+            'total': self._level(cube.by_year['Production_tonnes'], by_mineral_value.sum(axis=1), cube.counts.any(axis=(1, 2))),
+            'mineral': self._level(tonnes, by_mineral_value, cube.counts.any(axis=2)),
+            'country': self._level(cube.by_year_country['Production_tonnes'], by_country_value, cube.counts.any(axis=1)),
+        }
+        # Concentration of each mineral's production across countries, per year
+        self.hhi_by_year_mineral = hhi(cube.cells['Production_tonnes'], axis=2)
+        # Concentration of total production value across countries, per year
+        self.hhi_by_year = hhi(by_country_value, axis=1)
+        self.country_summary = self._country_summary()
+
+    def is_current(self, cube, minerals):
+        # Still derived from these exact (never modified in place) snapshot parts
+        return self.cube is cube and self.minerals is minerals
+
+    @staticmethod
+    def _prices(cube, minerals):
+        by_id = {info.get('MineralID'): info.get('MarketPriceUSD_per_tonne') for info in minerals.values()}
+        return pd.to_numeric(pd.Series([by_id.get(key) for key in cube.mineral_ids], dtype=object),
+                             errors='coerce').to_numpy(dtype=np.float64)
+
+    def _level(self, tonnes, value, present):
+        future, forecast_tonnes = trend_forecast(self.years, tonnes, present, self.horizon, self.window)
+        _, forecast_value = trend_forecast(self.years, value, present, self.horizon, self.window)
+        return {
+            'Production_tonnes': tonnes, 'ProductionValue_USD': value, 'present': present,
+            'growth_tonnes': yoy_growth(self.years, tonnes, present),
+            'growth_value': yoy_growth(self.years, value, present),
+            'forecast_years': future, 'forecast_tonnes': forecast_tonnes, 'forecast_value': forecast_value,
+        }
+
+    def _country_summary(self):
+        # Latest-year figures per country name, for the country profiles
+        level = self.levels['country']
+        present = level['present']
+        summary = {}
+        if not len(self.years):
+            return summary
+        # Index of each country's most recent populated year (-1 if none)
+        last = len(self.years) - 1 - np.argmax(present[::-1], axis=0)
+        last = np.where(present.any(axis=0), last, -1)
+        number = lambda value: None if np.isnan(value) else float(value)
+        for ci in np.flatnonzero(last >= 0):
+            t = last[ci]
+            summary[self.cube.country_names[ci]] = {
+                'year': int(self.years[t]),
+                'production_tonnes': float(level['Production_tonnes'][t, ci]),
+                'production_value_usd': float(level['ProductionValue_USD'][t, ci]),
+                'growth_tonnes': number(level['growth_tonnes'][t, ci]),
+                'forecast_year': int(level['forecast_years'][0]),
+                'forecast_tonnes': number(level['forecast_tonnes'][0, ci]),
+            }
+        return summary
+
+    def series(self, mi=None, ci=None):
+        # Yearly series for a cube filter: (years, {name: 1-D array}), plus forecast_years/forecast_*
+        if mi is None and ci is None:
+            level, index = self.levels['total'], ()
+        elif ci is None:
+            level, index = self.levels['mineral'], (mi,)
+        elif mi is None:
+            level, index = self.levels['country'], (ci,)
+        else:
+            tonnes = self.cube.cells['Production_tonnes'][:, mi, ci]
+            level, index = self._level(tonnes, tonnes * np.nan_to_num(self.prices[mi]), self.cube.counts[:, mi, ci] > 0), ()
+        pick = lambda arr: arr[(slice(None),) + index]
+        present = pick(level['present'])
+        out = {name: pick(level[name])[present] for name in ('Production_tonnes', 'ProductionValue_USD', 'growth_tonnes', 'growth_value')}
+        out['forecast_years'] = level['forecast_years']
+        out['forecast_tonnes'] = pick(level['forecast_tonnes'])
+        out['forecast_value'] = pick(level['forecast_value'])
+        return self.years[present], out
+
+    def concentration(self, mi=None):
+        # HHI per year: of one mineral's production across countries, else of total production value
+        if mi is None:
+            values = self.hhi_by_year
+        else:
+            values = self.hhi_by_year_mineral[:, mi]
+        keep = ~np.isnan(values)
+        return self.years[keep], values[keep]
@@ -1,501 +1,1128 @@
-from flask import Flask, render_template, request, redirect, url_for, session
-import pandas as pd
-import folium
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-
-app = Flask(__name__)
-app.secret_key = 'your_secret_key_here'  # Change for production
-
-# Load all CSVs with error handling
-try:
-    minerals_df = pd.read_csv('data/minerals.csv')
-    extra_minerals_df = pd.read_csv('data/extra_minerals.csv')
-    minerals_df = pd.concat([minerals_df, extra_minerals_df], ignore_index=True)  # Merge XLSX data
-    minerals = minerals_df.set_index('MineralName').to_dict('index')
-except Exception as e:
-    print(f"Error loading minerals: {e}")
-    minerals = {}  # Fallback empty dict
-
-try:
-    countries_df = pd.read_csv('data/countries.csv')
-    countries = countries_df.set_index('CountryName').to_dict('index')
-except Exception as e:
-    print(f"Error loading countries: {e}")
-    countries = {}
-
-try:
-    production_df = pd.read_csv('data/production_stats.csv')
-    # Fixed merge: Index lookup DFs on IDs for proper names
-    minerals_indexed = minerals_df.set_index('MineralID')
-    countries_indexed = countries_df.set_index('CountryID')
-    production_df = production_df.merge(minerals_indexed[['MineralName']], left_on='MineralID', right_index=True, how='left')
-    production_df = production_df.merge(countries_indexed[['CountryName']], left_on='CountryID', right_index=True, how='left')
-    df = production_df.rename(columns={'MineralName': 'mineral', 'CountryName': 'country'})
-except Exception as e:
-    print(f"Error loading production: {e}")
-    df = pd.DataFrame()  # Empty DF
-
-try:
-    users_df = pd.read_csv('data/users.csv')
-    users = users_df.set_index('Username').to_dict('index')
-except Exception as e:
-    print(f"Error loading users: {e}")
-    users = {}
-
-try:
-    roles_df = pd.read_csv('data/roles.csv')
-    PERMISSIONS = {}
-    # helper mapping of keywords to permission flags
-    keyword_map = {
-        'profile': 'profiles',
-        'profiles': 'profiles',
-        'chart': 'charts',
-        'charts': 'charts',
-        'export': 'export',
-        'exports': 'export',
-        'production': 'production',
-        'mineral': 'database',
-        'database': 'database',
-        'insight': 'insights',
-        'insights': 'insights',
-        'map': 'map',
-        'all': 'all',
-        'admin': 'all',
-        'administrator': 'all'
-    }
-    for _, row in roles_df.iterrows():
-        role_name = row['RoleName']
-        perms_str = str(row.get('Permissions', '')).lower()
-        flags = set()
-        # If the permission cell contains 'full' or 'all', grant all
-        if 'full' in perms_str or 'all access' in perms_str or 'full access' in perms_str:
-            flags.add('all')
-        else:
-            # search for keywords
-            for kw, flag in keyword_map.items():
-                if kw in perms_str:
-                    flags.add(flag)
-        PERMISSIONS[role_name] = sorted(list(flags))
-    # Ensure Researchers can view the map and export by default (policy override)
-    if 'Researcher' in PERMISSIONS:
-        if 'map' not in PERMISSIONS['Researcher']:
-            PERMISSIONS['Researcher'].append('map')
-        if 'export' not in PERMISSIONS['Researcher']:
-            PERMISSIONS['Researcher'].append('export')
-    # Make PERMISSIONS available in Jinja templates
-    app.jinja_env.globals.update(PERMISSIONS=PERMISSIONS)
-except Exception as e:
-    print(f"Error loading roles: {e}")
-    PERMISSIONS = {}
-
-try:
-    sites_df = pd.read_csv('data/sites.csv')
-    # Fixed merge for sites (same indexing)
-    minerals_indexed = minerals_df.set_index('MineralID')
-    countries_indexed = countries_df.set_index('CountryID')
-    sites_df = sites_df.merge(minerals_indexed[['MineralName']], left_on='MineralID', right_index=True, how='left')
-    sites_df = sites_df.merge(countries_indexed[['CountryName']], left_on='CountryID', right_index=True, how='left')
-    sites = sites_df.to_dict('records')
-except Exception as e:
-    print(f"Error loading sites: {e}")
-    sites = []
-
-@app.route('/')
-def index():
-    if 'user' in session:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('login'))
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    error = None
-    if request.method == 'POST':
-        username = request.form['username']
-        password = request.form['password']
-        if username in users and users[username]['PasswordHash'] == password:
-            session['user'] = username
-            role_id = users[username]['RoleID']
-            role_name = roles_df[roles_df['RoleID'] == role_id]['RoleName'].iloc[0] if not roles_df.empty else 'Unknown'
-            session['role'] = role_name
-            # Auto-redirect to dashboard with success message
-            return redirect(url_for('dashboard', success='Login successful!'))
-        else:
-            error = 'Invalid credentials. Try again.'
-            return render_template('login.html', error=error)
-    return render_template('login.html')
-
-@app.route('/logout')
-def logout():
-    session.clear()
-    return redirect(url_for('login'))
-
-
-@app.route('/dashboard')
-def dashboard():
-    success = request.args.get('success')  # Get success from redirect URL
-    if 'user' not in session:
-        return redirect(url_for('login'))
-    role = session['role']
-    allowed_features = []
-    is_admin = False
-    if 'all' in PERMISSIONS.get(role, []) or 'database' in PERMISSIONS.get(role, []):
-        allowed_features.append('database')
-    if 'all' in PERMISSIONS.get(role, []) or 'profiles' in PERMISSIONS.get(role, []):
-        allowed_features.append('profiles')
-    if 'all' in PERMISSIONS.get(role, []) or 'charts' in PERMISSIONS.get(role, []):
-        allowed_features.append('charts')
-    if 'all' in PERMISSIONS.get(role, []) or 'map' in PERMISSIONS.get(role, []):
-        allowed_features.append('map')
-    if 'all' in PERMISSIONS.get(role, []):
-        is_admin = True
-    num_countries = len(countries)
-    num_minerals = len(minerals)
-    num_sites = len(sites)
-    return render_template('dashboard.html', role=role, features=allowed_features, success=success, num_countries=num_countries, num_minerals=num_minerals, num_sites=num_sites, is_admin=is_admin)
-
-
-
-# Admin panel for editing, adding, and deleting data
-@app.route('/admin', methods=['GET', 'POST'])
-def admin():
-    if 'user' not in session or 'all' not in PERMISSIONS.get(session['role'], []):
-        return redirect(url_for('dashboard'))
-    message = None
-    global minerals, countries, sites
-    if request.method == 'POST':
-        action = request.form.get('action')
-        # Mineral edit
-        if action == 'edit_mineral':
-            mineral_name = request.form.get('mineral_name')
-            description = request.form.get('description')
-            price = request.form.get('market_price')
-            if mineral_name in minerals:
-                minerals[mineral_name]['Description'] = description
-                minerals[mineral_name]['MarketPriceUSD_per_tonne'] = price
-                message = f"Updated {mineral_name}. (Note: Changes are in-memory and not persisted to CSV.)"
-            else:
-                message = f"Mineral {mineral_name} not found."
-        # Mineral delete
-        elif action == 'delete_mineral':
-            mineral_name = request.form.get('mineral_name')
-            if mineral_name in minerals:
-                del minerals[mineral_name]
-                message = f"Deleted {mineral_name}. (In-memory only.)"
-            else:
-                message = f"Mineral {mineral_name} not found."
-        # Add country
-        elif action == 'add_country':
-            country_name = request.form.get('country_name')
-            gdp = request.form.get('gdp')
-            mining_revenue = request.form.get('mining_revenue')
-            key_projects = request.form.get('key_projects')
-            if country_name and country_name not in countries:
-                countries[country_name] = {
-                    'GDP_BillionUSD': gdp,
-                    'MiningRevenue_BillionUSD': mining_revenue,
-                    'KeyProjects': key_projects
-                }
-                message = f"Added country {country_name}. (In-memory only.)"
-            else:
-                message = f"Country {country_name} already exists or invalid."
-        # Delete country
-        elif action == 'delete_country':
-            country_name = request.form.get('country_name')
-            if country_name in countries:
-                del countries[country_name]
-                message = f"Deleted country {country_name}. (In-memory only.)"
-            else:
-                message = f"Country {country_name} not found."
-        # Add site
-        elif action == 'add_site':
-            site_name = request.form.get('site_name')
-            country_name = request.form.get('site_country')
-            mineral_name = request.form.get('site_mineral')
-            latitude = request.form.get('latitude')
-            longitude = request.form.get('longitude')
-            production = request.form.get('production')
-            if site_name and country_name in countries and mineral_name in minerals:
-                new_site = {
-                    'SiteName': site_name,
-                    'CountryName': country_name,
-                    'MineralName': mineral_name,
-                    'Latitude': float(latitude),
-                    'Longitude': float(longitude),
-                    'Production_tonnes': int(production)
-                }
-                sites.append(new_site)
-                message = f"Added site {site_name}. (In-memory only.)"
-            else:
-                message = f"Invalid site data or missing country/mineral."
-        # Delete site
-        elif action == 'delete_site':
-            site_name = request.form.get('site_name')
-            found = False
-            for i, s in enumerate(sites):
-                if s.get('SiteName') == site_name:
-                    del sites[i]
-                    found = True
-                    message = f"Deleted site {site_name}. (In-memory only.)"
-                    break
-            if not found:
-                message = f"Site {site_name} not found."
-        # Preview site coordinates on small map (admin)
-        elif action == 'preview_site':
-            site_name = request.form.get('site_name_edit')
-            lat = request.form.get('edit_latitude')
-            lon = request.form.get('edit_longitude')
-            try:
-                lat_f = float(lat)
-                lon_f = float(lon)
-                # small folium map centered on the preview coordinates
-                m_preview = folium.Map(location=[lat_f, lon_f], zoom_start=9, tiles='OpenStreetMap')
-                folium.Marker([lat_f, lon_f], popup=f"Preview: {site_name}").add_to(m_preview)
-                map_html_admin = m_preview._repr_html_()
-            except Exception:
-                map_html_admin = None
-                message = 'Invalid preview coordinates.'
-            return render_template('admin.html', minerals=minerals, countries=countries, sites=sites, message=message, map_html_admin=map_html_admin)
-        # Save edited coordinates
-        elif action == 'save_site_coords':
-            site_name = request.form.get('site_name_edit')
-            lat = request.form.get('edit_latitude')
-            lon = request.form.get('edit_longitude')
-            try:
-                lat_f = float(lat)
-                lon_f = float(lon)
-                updated = False
-                for s in sites:
-                    if s.get('SiteName') == site_name:
-                        s['Latitude'] = lat_f
-                        s['Longitude'] = lon_f
-                        updated = True
-                        message = f"Updated coordinates for {site_name}."
-                        break
-                if not updated:
-                    message = f"Site {site_name} not found."
-            except Exception:
-                message = 'Invalid coordinates; update failed.'
-    return render_template('admin.html', minerals=minerals, countries=countries, sites=sites, message=message)
-
-
-# In-memory insights storage
-insights = []
-
-@app.route('/mineral_database', methods=['GET', 'POST'])
-def mineral_database():
-    if 'user' not in session or ('database' not in PERMISSIONS.get(session['role'], []) and 'all' not in PERMISSIONS.get(session['role'], [])):
-        return redirect(url_for('dashboard'))
-    message = None
-    search_query = request.args.get('search', '').strip().lower()
-    filtered_minerals = minerals
-    if search_query:
-        filtered_minerals = {k: v for k, v in minerals.items() if search_query in k.lower() or search_query in v.get('Description','').lower()}
-    # Allow researchers to add insights
-    if request.method == 'POST' and 'insight' in request.form:
-        user = session.get('user', 'unknown')
-        role = session.get('role', '')
-        # Only allow researchers (or those with 'insights' permission) to add insights
-        if role == 'Researcher' or 'insights' in PERMISSIONS.get(role, []):
-            insight = request.form.get('insight')
-            if insight:
-                insights.append({'user': user, 'insight': insight, 'type': 'mineral'})
-                message = 'Insight added.'
-        else:
-            message = 'You do not have permission to add insights.'
-    return render_template('mineral_database.html', minerals=filtered_minerals, insights=[i for i in insights if i['type']=='mineral'], message=message, search_query=search_query)
-
-# Download PDF of mineral data (researcher only)
-@app.route('/download/minerals.pdf')
-def download_minerals_pdf():
-    # Only Researcher role may download PDFs
-    if 'user' not in session or session.get('role') != 'Researcher':
-        return redirect(url_for('dashboard'))
-    from io import BytesIO
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    p.setFont("Helvetica", 12)
-    y = 750
-    p.drawString(30, y, "Mineral Data Export")
-    y -= 30
-    for mineral, info in minerals.items():
-        p.drawString(30, y, f"{mineral}: {info.get('Description','')} | ${info.get('MarketPriceUSD_per_tonne','')}")
-        y -= 20
-        if y < 50:
-            p.showPage()
-            y = 750
-    p.save()
-    buffer.seek(0)
-    return app.response_class(buffer, mimetype='application/pdf', headers={"Content-Disposition": "attachment;filename=minerals.pdf"})
-
-# Download PDF of country data (researcher only)
-@app.route('/download/countries.pdf')
-def download_countries_pdf():
-    # Only Researcher role may download PDFs
-    if 'user' not in session or session.get('role') != 'Researcher':
-        return redirect(url_for('dashboard'))
-    from io import BytesIO
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    p.setFont("Helvetica", 12)
-    y = 750
-    p.drawString(30, y, "Country Data Export")
-    y -= 30
-    for country, info in countries.items():
-        p.drawString(30, y, f"{country}: GDP ${info.get('GDP_BillionUSD','')}B | Mining Revenue ${info.get('MiningRevenue_BillionUSD','')}B | Projects: {info.get('KeyProjects','')}")
-        y -= 20
-        if y < 50:
-            p.showPage()
-            y = 750
-    p.save()
-    buffer.seek(0)
-    return app.response_class(buffer, mimetype='application/pdf', headers={"Content-Disposition": "attachment;filename=countries.pdf"})
-
-
-@app.route('/country_profiles', methods=['GET', 'POST'])
-def country_profiles():
-    if 'user' not in session or ('profiles' not in PERMISSIONS.get(session['role'], []) and 'all' not in PERMISSIONS.get(session['role'], [])):
-        return redirect(url_for('dashboard'))
-    message = None
-    search_query = request.args.get('search', '').strip().lower()
-    filtered_countries = countries
-    if search_query:
-        filtered_countries = {k: v for k, v in countries.items() if search_query in k.lower() or search_query in v.get('KeyProjects','').lower()}
-    # Allow researchers to add insights
-    if request.method == 'POST' and 'insight' in request.form:
-        user = session.get('user', 'unknown')
-        role = session.get('role', '')
-        # Only allow researchers (or those with 'insights' permission) to add insights
-        if role == 'Researcher' or 'insights' in PERMISSIONS.get(role, []):
-            insight = request.form.get('insight')
-            if insight:
-                insights.append({'user': user, 'insight': insight, 'type': 'country'})
-                message = 'Insight added.'
-        else:
-            message = 'You do not have permission to add insights.'
-    return render_template('country_profiles.html', countries=filtered_countries, insights=[i for i in insights if i['type']=='country'], message=message, search_query=search_query)
-
-@app.route('/interactive_charts')
-def interactive_charts():
-    if 'user' not in session or ('charts' not in PERMISSIONS.get(session['role'], []) and 'all' not in PERMISSIONS.get(session['role'], [])):
-        return redirect(url_for('dashboard'))
-    # Basic filters for interactivity (Appendix A)
-    mineral_filter = request.args.get('mineral', 'all')
-    country_filter = request.args.get('country', 'all')
-    filtered_df = df.copy()
-    if mineral_filter != 'all':
-        filtered_df = filtered_df[filtered_df['mineral'] == mineral_filter]
-    if country_filter != 'all':
-        filtered_df = filtered_df[filtered_df['country'] == country_filter]
-    # Fixed charts: Ensure data has names/values, fallback to full df if empty
-    if filtered_df.empty:
-        filtered_df = df.copy()
-    # Check if columns exist, fallback to IDs if merge failed
-    color_col = 'mineral' if 'mineral' in filtered_df.columns else 'MineralID'
-    country_col = 'country' if 'country' in filtered_df.columns else 'CountryID'
-    # Choose a modern color palette
-    palette = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
-
-    # Production as bar (categorical)
-    fig_prod = px.bar(filtered_df, x='Year', y='Production_tonnes', color=color_col, barmode='group',
-                      title=f'Production Trends {mineral_filter if mineral_filter != "all" else ""} in {country_filter if country_filter != "all" else ""}',
-                      hover_data=[country_col, 'ExportValue_BillionUSD'], labels={'Production_tonnes': 'Tonnes'},
-                      color_discrete_sequence=palette)
-    fig_prod.update_layout(template='plotly_white')
-    chart_div = fig_prod.to_html(full_html=False)
-
-    # Export as line (trends)
-    fig_export = px.line(filtered_df, x='Year', y='ExportValue_BillionUSD', color=color_col,
-                         title=f'Export Value Trends {mineral_filter if mineral_filter != "all" else ""} in {country_filter if country_filter != "all" else ""}',
-                         hover_data=[country_col, 'Production_tonnes'], labels={'ExportValue_BillionUSD': 'Billion USD'},
-                         color_discrete_sequence=palette)
-    fig_export.update_traces(mode='lines+markers')
-    fig_export.update_layout(template='plotly_white')
-    price_div = fig_export.to_html(full_html=False)
-
-    # Additional chart 1: Production share pie by mineral (or country if mineral selected)
-    try:
-        if mineral_filter == 'all':
-            pie_df = filtered_df.groupby('mineral', as_index=False).sum()
-            names = pie_df['mineral']
-            values = pie_df['Production_tonnes']
-            pie_title = 'Production Share by Mineral'
-        else:
-            pie_df = filtered_df.groupby('country', as_index=False).sum()
-            names = pie_df['country']
-            values = pie_df['Production_tonnes']
-            pie_title = 'Production Share by Country'
-    except Exception:
-        names = filtered_df['mineral'] if 'mineral' in filtered_df.columns else filtered_df.get('MineralID', [])
-        values = filtered_df['Production_tonnes'] if 'Production_tonnes' in filtered_df.columns else []
-        pie_title = 'Production Share'
-    fig_pie = px.pie(names=names, values=values, title=pie_title, color_discrete_sequence=palette)
-    fig_pie.update_layout(template='plotly_white')
-    pie_div = fig_pie.to_html(full_html=False)
-
-    # Additional chart 2: Combined production (bar) and export (line) over years
-    yearly = filtered_df.groupby('Year', as_index=False).sum()
-    fig_combo = make_subplots(specs=[[{"secondary_y": True}]])
-    fig_combo.add_trace(go.Bar(x=yearly['Year'], y=yearly['Production_tonnes'], name='Production (tonnes)', marker_color=palette[0]))
-    fig_combo.add_trace(go.Scatter(x=yearly['Year'], y=yearly['ExportValue_BillionUSD'], name='Export Value (B USD)', mode='lines+markers', marker_color=palette[1]), secondary_y=True)
-    fig_combo.update_layout(title_text='Production vs Export Value (Yearly)', template='plotly_white')
-    fig_combo.update_xaxes(title_text='Year')
-    fig_combo.update_yaxes(title_text='Production (tonnes)', secondary_y=False)
-    fig_combo.update_yaxes(title_text='Export Value (B USD)', secondary_y=True)
-    combo_div = fig_combo.to_html(full_html=False)
-
-    return render_template('interactive_charts.html', chart_div=chart_div, price_div=price_div, pie_div=pie_div, combo_div=combo_div, minerals=list(minerals.keys()), countries=list(countries.keys()))
-
-@app.route('/geographical_map')
-def geographical_map():
-    if 'user' not in session or ('map' not in PERMISSIONS.get(session['role'], []) and 'all' not in PERMISSIONS.get(session['role'], [])):
-        return redirect(url_for('dashboard'))
-    # Basic filter for map (Appendix A: alternatives/deposits)
-    mineral_filter = request.args.get('mineral', 'all')
-    filtered_sites = sites
-    if mineral_filter != 'all':
-        filtered_sites = [s for s in sites if s.get('MineralName') == mineral_filter]
-    m = folium.Map(location=[0, 20], zoom_start=3, tiles=None, attr='Google Maps (English)')
-    # Google Satellite default (English labels, real imagery)
-    folium.TileLayer(tiles='https://mt1.google.com/vt/lyrs=s,h&x={x}&y={y}&z={z}&hl=en', 
-                     attr='Google Satellite (English)', name='Google Satellite (English)', overlay=False, control=True).add_to(m)
-    # Google Roadmap for streets (English)
-    folium.TileLayer(tiles='https://mt1.google.com/vt/lyrs=m&x={x}&y={y}&z={z}&hl=en', 
-                     attr='Google Roadmap (English)', name='Google Roadmap (English)', overlay=False, control=True).add_to(m)
-    folium.LayerControl().add_to(m)
-    coords = []
-    for site in filtered_sites:
-        # Ensure numeric coordinates and robust handling of swapped values
-        try:
-            lat = float(site.get('Latitude', 0))
-            lon = float(site.get('Longitude', 0))
-        except Exception:
-            # Skip site if coordinates are not parseable
-            continue
-
-        # If values look swapped (lat outside [-90,90] but lon inside), swap them
-        if (abs(lat) > 90 and abs(lon) <= 90) or (abs(lon) > 180) or (abs(lat) > 180 and abs(lon) <= 180):
-            lat, lon = lon, lat
-
-        # After potential swap, verify ranges
-        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
-            # Skip invalid coordinates
-            continue
-
-        coords.append((lat, lon))
-        popup = f"{site.get('SiteName','Unknown Site')} - {site.get('MineralName', 'Unknown')} in {site.get('CountryName', 'Unknown')} ({site.get('Production_tonnes', 'n/a')} tonnes)"
-        folium.Marker([lat, lon], popup=popup).add_to(m)
-
-    # Fit map to markers if we have any, otherwise keep default
-    if coords:
-        m.fit_bounds([ [min(r[0] for r in coords), min(r[1] for r in coords)], [max(r[0] for r in coords), max(r[1] for r in coords)] ])
-    map_html = m._repr_html_()
-    return render_template('geographical_map.html', map_html=map_html, minerals=list(minerals.keys()))
-
-if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+import time
+_startup_started = time.perf_counter()
+import os
+import sys
+import threading
+import json
+import zlib
+import uuid
+import importlib.metadata
+import importlib.util
+from functools import wraps
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file, stream_with_context, g, has_request_context
+import pandas as pd
+import backends
+from chart_cache import ChartCache, normalize_filter
+from site_index import normalize_coords, parse_bbox
+from storage import TABLES, csv_fingerprint, open_store, read_csv_table
+from exports import EXPORTS, FORMATS, ExportManager, iter_records
+from permissions import ALL, BITS, RoleTable, allows, mask_for
+from data_loader import CsvWatcher, apply_rows, apply_table, build_snapshot, diff_frames, next_key
+import columnar
+from json_api import CachedResponse, negotiate
+from instrumentation import Instrumentation, phase
+from insights import open_insight_log
+from analytics import Analytics
+from render_pool import RenderPools, parse_lanes
+
+# Startup timing (python -m app --startup-profile): (step, seconds) recorded until the app is ready
+STARTUP_TIMINGS = []
+_startup_last = _startup_started
+_startup_done = False
+
+def startup_mark(step):
+    global _startup_last
+    if _startup_done:
+        return
+    now = time.perf_counter()
+    STARTUP_TIMINGS.append((step, now - _startup_last))
+    _startup_last = now
+
+startup_mark('import flask/pandas/numpy')
+
+# Rendering backends are imported on first use (PRELOAD_BACKENDS=1 loads them eagerly)
+folium = backends.lazy('folium')
+px = backends.lazy('plotly.express')
+go = backends.lazy('plotly.graph_objects')
+subplots = backends.lazy('plotly.subplots')
+
+app = Flask(__name__)
+app.secret_key = 'your_secret_key_here'  # Change for production
+
+# Request metrics (served at /metrics). Registered first so its timing covers the other hooks.
+# Profiles: X-Profile: 1 or ?_profile=1 (admins), or PROFILE_SAMPLE_RATE for random sampling.
+metrics = Instrumentation(app, profile_dir=os.environ.get('PROFILE_DIR', 'data/profiles'),
+                          profile_sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+                          trace_allocations=os.environ.get('METRICS_TRACE_ALLOCATIONS', '').lower() in ('1', 'true', 'yes'),
+                          can_profile=lambda: 'user' in session and bool(current_mask() & ALL))
+
+# Data version: bumped whenever loaded data is reloaded or edited so caches can key on it
+DATA_VERSION = 0
+_data_version_lock = threading.Lock()
+
+def bump_data_version(version=None):
+    # With a shared store the store's version is used so every worker agrees on it
+    global DATA_VERSION
+    with _data_version_lock:
+        DATA_VERSION = version if version is not None else DATA_VERSION + 1
+        version = DATA_VERSION
+    chart_cache.discard_older(version)
+    api_cache.discard_older(version)
+    return version
+
+# Rendered chart fragments keyed by (DATA_VERSION, mineral, country)
+chart_cache = ChartCache(maxsize=int(os.environ.get('CHART_CACHE_SIZE', 256)))
+
+# Serialized JSON API responses keyed by (DATA_VERSION, path, query)
+api_cache = ChartCache(maxsize=int(os.environ.get('API_CACHE_SIZE', 512)))
+
+metrics.register_cache('charts', chart_cache)
+metrics.register_cache('api', api_cache)
+metrics.gauge('app_data_version', 'Data version currently served by this worker.', lambda: DATA_VERSION)
+
+# Finished exports cached on disk by data version; large ones are built in a process pool
+export_manager = ExportManager(os.environ.get('EXPORT_CACHE_DIR', 'data/exports'),
+                               max_workers=int(os.environ.get('EXPORT_WORKERS', 2)),
+                               async_rows=int(os.environ.get('EXPORT_ASYNC_ROWS', 20000)))
+_instance_token = uuid.uuid4().hex[:8]
+
+# Concurrency caps for the slow renderers (RENDER_LANES="charts=2,maps=2,exports=2", or none).
+# Only cache misses take a slot; a render finding its lane full gets a 503 with Retry-After.
+# The launchers also cap renders overall below the server's thread count (see size_for)
+render_pools = RenderPools(parse_lanes(os.environ.get('RENDER_LANES', 'charts=2,maps=2,exports=2')), metrics)
+
+# Persistent store shared by all workers; DATA_STORE=none keeps the CSV-only in-memory mode
+try:
+    store = open_store(os.environ.get('DATA_STORE', 'data/minerals_app.db'))
+    if store is not None:
+        store.import_csvs('data')  # no-op once the database has been populated
+except Exception as e:
+    print(f"Error opening data store: {e}")
+    store = None
+startup_mark('open data store')
+_store_version = None
+_table_versions = {}  # table -> store version of its last change, as loaded here
+
+# Current data snapshot. Snapshots are never modified once published: reloads and admin
+# edits build a changed copy and swap it in (see publish), so readers need no locks
+_snapshot = None
+role_table = None
+_reload_lock = threading.RLock()
+
+# Polls data/*.csv so edited files are applied as row deltas without a restart
+csv_watcher = CsvWatcher('data', store.csv_fingerprints() if store is not None else None)
+DATA_WATCH_INTERVAL = float(os.environ.get('DATA_WATCH_INTERVAL', 5))
+
+def read_table(table):
+    # Read a table from the store, or straight from data/*.csv without one
+    if store is not None:
+        return store.frame(table)
+    return read_csv_table('data', table)
+
+# Prebuilt memory-mapped copy of the tables (python columnar.py build); DATA_SNAPSHOT=none disables
+DATA_SNAPSHOT = os.environ.get('DATA_SNAPSHOT', 'data/snapshot')
+
+SEARCH_PAGE_SIZE = 24
+
+def load_data():
+    # (Re)build every in-memory structure from the store/CSVs
+    global _store_version, _table_versions
+    with _reload_lock:
+        if store is not None:
+            _store_version, _table_versions = store.versions()
+        prebuilt = None
+        if DATA_SNAPSHOT.lower() != 'none':
+            # Only used when built from exactly the data we would otherwise read
+            source = {'store_version': _store_version} if store is not None else columnar.current_source(None, 'data')
+            prebuilt = columnar.open_snapshot(DATA_SNAPSHOT, source)
+        if prebuilt is not None:
+            snap = build_snapshot(prebuilt.frame, startup_mark, joined=True)
+        else:
+            snap = build_snapshot(read_table, startup_mark)
+        publish(snap, _store_version)
+
+def publish(snap, version=None):
+    # Swap in a new snapshot under a new data version. Views never read the data through
+    # module-level names: each takes current_snapshot() once and reads only from it.
+    global _snapshot
+    with _reload_lock:
+        if snap.role_table is not role_table:
+            apply_roles(snap.role_table)
+        changes = {'version': version if version is not None else DATA_VERSION + 1}
+        # Derived metrics are recomputed once per data version, only when their inputs changed
+        if snap.analytics is None or not snap.analytics.is_current(snap.production_cube, snap.minerals):
+            with phase('analytics'):
+                changes['analytics'] = Analytics(snap.production_cube, snap.minerals)
+            startup_mark('derive analytics')
+        snap = snap.replace(**changes)
+        _snapshot = snap
+        bump_data_version(snap.version)
+    return snap
+
+def sync_from_store():
+    # Catch up with the shared store, re-reading and diffing only the tables that changed
+    global _store_version, _table_versions
+    with _reload_lock:
+        version, table_versions = store.versions()
+        if version == _store_version:
+            return
+        try:
+            snap = _snapshot
+            for table in TABLES:
+                if table_versions.get(table) != _table_versions.get(table):
+                    snap, _ = apply_table(snap, table, store.frame(table))
+        except Exception as e:
+            print(f"Error applying store changes, reloading everything: {e}")
+            load_data()
+            return
+        _store_version, _table_versions = version, table_versions
+        publish(snap, version)
+
+def reload_changed_csvs():
+    # Apply edited data/*.csv files as row-level deltas; returns the tables that changed.
+    # A changed CSV is authoritative for its table: rows are diffed by primary key against
+    # what is loaded (or stored) and only the difference is applied.
+    with _reload_lock:
+        changed = csv_watcher.poll()
+        snap = _snapshot
+        applied = []
+        for table, fingerprint in changed.items():
+            try:
+                frame = read_csv_table('data', table)
+            except Exception as e:
+                print(f"Error reading changed {table} CSV: {e}")
+                csv_watcher.mark(table, fingerprint)
+                continue
+            if csv_fingerprint('data', table) != fingerprint:
+                continue  # still being written; retry on the next poll
+            try:
+                if store is not None:
+                    delta = diff_frames(store.frame(table) if store.has_table(table) else None, frame, TABLES[table]['key'])
+                    if store.apply_csv_delta(table, delta.upserts, delta.deleted, fingerprint) is not None:
+                        applied.append(table)
+                else:
+                    snap, _ = apply_table(snap, table, frame)
+                    applied.append(table)
+            except Exception as e:
+                print(f"Error applying changed {table} CSV: {e}")
+            csv_watcher.mark(table, fingerprint)
+        if store is not None:
+            sync_from_store()
+        elif snap is not _snapshot:
+            publish(snap)
+        return applied
+
+def watch_data_dir():
+    while True:
+        time.sleep(DATA_WATCH_INTERVAL)
+        try:
+            reload_changed_csvs()
+        except Exception as e:
+            print(f"Error reloading data: {e}")
+
+def apply_roles(table):
+    global role_table, PERMISSIONS
+    role_table = table
+    PERMISSIONS = table.permissions
+    # Make PERMISSIONS available in Jinja templates
+    app.jinja_env.globals.update(PERMISSIONS=PERMISSIONS)
+
+def reload_roles():
+    # Recompile permissions after roles.csv changes; other workers pick it up through the store
+    roles_frame = pd.read_csv(os.path.join('data', 'roles.csv'))
+    save_change(lambda st: st.replace_table('roles', roles_frame),
+                lambda snap, _: snap.replace(role_table=RoleTable.from_frame(roles_frame)))
+
+def current_mask():
+    # The session caches its compiled mask; it is recomputed only when the roles table changes
+    if session.get('perm_version') != role_table.version:
+        session['perm_mask'] = role_table.mask(session.get('role'))
+        session['perm_version'] = role_table.version
+    return session['perm_mask']
+
+def has_flag(flag):
+    # Exact flag check (no 'all' override), as used for adding insights
+    return bool(current_mask() & BITS[flag])
+
+def requires(*flags, role=None, api=False):
+    # Route guard: logged in, optionally a specific role, and every flag ('all' grants everything)
+    required = mask_for(*flags)
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if 'user' not in session:
+                return (jsonify({'error': 'login required'}), 401) if api else redirect(url_for('login'))
+            if (role is not None and session.get('role') != role) or (required and not allows(current_mask(), required)):
+                return (jsonify({'error': 'forbidden'}), 403) if api else redirect(url_for('dashboard'))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+def save_change(write, update=None):
+    # Write a change through to the shared store (if any), then publish the changed copy of the
+    # snapshot built by update(snapshot, write_result) under the new data version
+    global _store_version
+    with _reload_lock:
+        if store is None:
+            publish(update(_snapshot, None) if update else _snapshot)
+            return None
+        result, version = write(store)
+        if _store_version is not None and version != _store_version + 1:
+            # Another worker wrote in between: pick up its changes (and ours) from the store
+            sync_from_store()
+        else:
+            # Only our own write: record the tables it touched as already applied
+            _, table_versions = store.versions()
+            _table_versions.update({t: v for t, v in table_versions.items() if v == version})
+            _store_version = version
+            publish(update(_snapshot, result) if update else _snapshot, version)
+    return result
+
+def current_snapshot():
+    # The snapshot pinned for this request (consistent across all of its reads), else the latest
+    if has_request_context() and 'snapshot' in g:
+        return g.snapshot
+    return _snapshot
+
+def persist_note():
+    return "(Saved.)" if store is not None else "(In-memory only.)"
+
+load_data()
+
+@app.before_request
+def sync_with_store():
+    # Another worker wrote to the shared store: apply its changes to this worker's copy
+    if store is None:
+        return
+    try:
+        version = store.version()
+    except Exception as e:
+        print(f"Error checking data store version: {e}")
+        return
+    if version != _store_version:
+        with phase('data_sync'):
+            sync_from_store()
+
+@app.before_request
+def pin_snapshot():
+    # One reference grab per request; later publishes do not affect what this request sees
+    g.snapshot = _snapshot
+
+@app.route('/')
+def index():
+    if 'user' in session:
+        return redirect(url_for('dashboard'))
+    return redirect(url_for('login'))
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    error = None
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        users = current_snapshot().users
+        if username in users and users[username]['PasswordHash'] == password:
+            session['user'] = username
+            role_id = users[username]['RoleID']
+            session['role'] = role_table.role_name(role_id)
+            current_mask()
+            # Auto-redirect to dashboard with success message
+            return redirect(url_for('dashboard', success='Login successful!'))
+        else:
+            error = 'Invalid credentials. Try again.'
+            return render_template('login.html', error=error)
+    return render_template('login.html')
+
+@app.route('/logout')
+def logout():
+    session.clear()
+    return redirect(url_for('login'))
+
+
+@app.route('/dashboard')
+@requires()
+def dashboard():
+    success = request.args.get('success')  # Get success from redirect URL
+    role = session['role']
+    mask = current_mask()
+    allowed_features = [f for f in ('database', 'profiles', 'charts', 'map') if allows(mask, BITS[f])]
+    is_admin = bool(mask & ALL)
+    snap = current_snapshot()
+    num_countries = len(snap.countries)
+    num_minerals = len(snap.minerals)
+    num_sites = len(snap.sites)
+    return render_template('dashboard.html', role=role, features=allowed_features, success=success, num_countries=num_countries, num_minerals=num_minerals, num_sites=num_sites, is_admin=is_admin)
+
+
+
+# Admin edits go through data_loader.apply_rows: the same delta path a reload or another
+# worker's sync_from_store takes, so renames and deletes relabel production rows and sites
+# identically everywhere. Note: site edits are O(n) in the number of sites: the registry's
+# indexes and spatial grid are copied (~0.12 s at 100k sites). Fine for occasional admin
+# edits; bulk site changes should go through a CSV/store reload, which builds one new
+# registry for the whole batch.
+# Admin panel for editing, adding, and deleting data. Edits never modify the published
+# data in place; each builds a changed copy of the snapshot that save_change publishes.
+@app.route('/admin', methods=['GET', 'POST'])
+@requires('all')
+def admin():
+    message = None
+    snap = current_snapshot()
+    minerals, countries, sites = snap.minerals, snap.countries, snap.sites
+    if request.method == 'POST':
+        action = request.form.get('action')
+        # Mineral edit
+        if action == 'edit_mineral':
+            mineral_name = request.form.get('mineral_name')
+            description = request.form.get('description')
+            price = request.form.get('market_price')
+            if mineral_name in minerals:
+                row = dict(minerals[mineral_name], MineralName=mineral_name, Description=description, MarketPriceUSD_per_tonne=price)
+                save_change(lambda st: st.update('minerals', 'MineralName', mineral_name, {'Description': description, 'MarketPriceUSD_per_tonne': price}),
+                            lambda snap, _: apply_rows(snap, 'minerals', [row]))
+                message = f"Updated {mineral_name}. {persist_note()}"
+            else:
+                message = f"Mineral {mineral_name} not found."
+        # Mineral delete
+        elif action == 'delete_mineral':
+            mineral_name = request.form.get('mineral_name')
+            if mineral_name in minerals:
+                mineral_id = minerals[mineral_name].get('MineralID')
+                save_change(lambda st: st.delete('minerals', 'MineralName', mineral_name),
+                            lambda snap, _: apply_rows(snap, 'minerals', deleted=[mineral_id]))
+                message = f"Deleted {mineral_name}. {persist_note()}"
+            else:
+                message = f"Mineral {mineral_name} not found."
+        # Add country
+        elif action == 'add_country':
+            country_name = request.form.get('country_name')
+            gdp = request.form.get('gdp')
+            mining_revenue = request.form.get('mining_revenue')
+            key_projects = request.form.get('key_projects')
+            if country_name and country_name not in countries:
+                new_country = {
+                    'GDP_BillionUSD': gdp,
+                    'MiningRevenue_BillionUSD': mining_revenue,
+                    'KeyProjects': key_projects
+                }
+                def update(snap, country_id):
+                    if country_id is None:
+                        country_id = next_key(snap, 'countries')
+                    return apply_rows(snap, 'countries', [dict(new_country, CountryName=country_name, CountryID=country_id)])
+                save_change(lambda st: st.insert('countries', dict(new_country, CountryName=country_name)), update)
+                message = f"Added country {country_name}. {persist_note()}"
+            else:
+                message = f"Country {country_name} already exists or invalid."
+        # Delete country
+        elif action == 'delete_country':
+            country_name = request.form.get('country_name')
+            if country_name in countries:
+                country_id = countries[country_name].get('CountryID')
+                save_change(lambda st: st.delete('countries', 'CountryName', country_name),
+                            lambda snap, _: apply_rows(snap, 'countries', deleted=[country_id]))
+                message = f"Deleted country {country_name}. {persist_note()}"
+            else:
+                message = f"Country {country_name} not found."
+        # Add site
+        elif action == 'add_site':
+            site_name = request.form.get('site_name')
+            country_name = request.form.get('site_country')
+            mineral_name = request.form.get('site_mineral')
+            latitude = request.form.get('latitude')
+            longitude = request.form.get('longitude')
+            production = request.form.get('production')
+            if site_name and country_name in countries and mineral_name in minerals:
+                new_site = {
+                    'SiteName': site_name,
+                    'CountryName': country_name,
+                    'MineralName': mineral_name,
+                    'Latitude': float(latitude),
+                    'Longitude': float(longitude),
+                    'Production_tonnes': int(production)
+                }
+                record = dict(new_site, CountryID=countries[country_name].get('CountryID'), MineralID=minerals[mineral_name].get('MineralID'))
+                save_change(lambda st: st.insert('sites', record),
+                            lambda snap, site_id: apply_rows(snap, 'sites', [dict(record, SiteID=next_key(snap, 'sites') if site_id is None else site_id)]))
+                message = f"Added site {site_name}. {persist_note()}"
+            else:
+                message = f"Invalid site data or missing country/mineral."
+        # Delete site
+        elif action == 'delete_site':
+            site_name = request.form.get('site_name')
+            site = sites.by_name(site_name)
+            if site is not None:
+                save_change(lambda st: st.delete('sites', 'SiteID', site.SiteID),
+                            lambda snap, _: apply_rows(snap, 'sites', deleted=[site.SiteID]))
+                message = f"Deleted site {site_name}. {persist_note()}"
+            else:
+                message = f"Site {site_name} not found."
+        # Recompile permissions from data/roles.csv
+        elif action == 'reload_roles':
+            try:
+                reload_roles()
+                message = f"Reloaded {len(PERMISSIONS)} roles from roles.csv."
+            except Exception as e:
+                message = f"Could not reload roles: {e}"
+        # Save edited coordinates
+        elif action == 'save_site_coords':
+            site_name = request.form.get('site_name_edit')
+            lat = request.form.get('edit_latitude')
+            lon = request.form.get('edit_longitude')
+            try:
+                lat_f = float(lat)
+                lon_f = float(lon)
+                site = sites.by_name(site_name)
+                if site is not None:
+                    # Stored as the registry will hold them (swapped lat/lon fixed)
+                    lat_f, lon_f = normalize_coords(lat_f, lon_f) or (lat_f, lon_f)
+                    save_change(lambda st: st.update('sites', 'SiteID', site.SiteID, {'Latitude': lat_f, 'Longitude': lon_f}),
+                                lambda snap, _: apply_rows(snap, 'sites', [dict(site.to_dict(), Latitude=lat_f, Longitude=lon_f)]))
+                    message = f"Updated coordinates for {site_name}."
+                else:
+                    message = f"Site {site_name} not found."
+            except Exception:
+                message = 'Invalid coordinates; update failed.'
+    if request.method == 'POST':
+        # Show the data as saved, including this request's edit
+        snap = _snapshot
+    return render_template('admin.html', minerals=snap.minerals, countries=snap.countries, sites=snap.sites, message=message, persistent=store is not None)
+
+
+# Researcher insights: append-only log in the shared store (or a JSONL file without one),
+# read a page at a time so rendering cost does not grow with the number of insights
+try:
+    insight_log = open_insight_log(store, os.environ.get('INSIGHTS_LOG', 'data/insights.jsonl'),
+                                   tail_size=int(os.environ.get('INSIGHTS_TAIL_SIZE', 200)))
+except Exception as e:
+    print(f"Error opening insights log: {e}")
+    insight_log = open_insight_log(None, os.environ.get('INSIGHTS_LOG', 'data/insights.jsonl'))
+
+def add_insight(kind, subjects):
+    # Record a posted insight; returns the status message for the page
+    if not (session.get('role') == 'Researcher' or has_flag('insights')):
+        return 'You do not have permission to add insights.'
+    insight = request.form.get('insight', '').strip()
+    if not insight:
+        return None
+    subject = request.form.get('subject', '').strip() or None
+    if subject is not None and subject not in subjects:
+        return f'Unknown {kind}: {subject}'
+    insight_log.append(kind, session.get('user', 'unknown'), insight, subject)
+    return 'Insight added.'
+
+def insight_page(kind):
+    # One page of insights (newest first) filtered by ?insights_subject= / ?insights_user=,
+    # continued with the ?insights_before= cursor
+    subject = request.args.get('insights_subject') or None
+    user = request.args.get('insights_user') or None
+    before = request.args.get('insights_before', type=int)
+    items, cursor = insight_log.page(kind, subject=subject, user=user, before=before)
+    more_url = None
+    if cursor is not None:
+        args = request.args.to_dict()
+        args['insights_before'] = cursor
+        more_url = url_for(request.endpoint, **args)
+    return items, more_url
+
+@app.route('/mineral_database', methods=['GET', 'POST'])
+@requires('database')
+def mineral_database():
+    message = None
+    search_query = request.args.get('search', '').strip().lower()
+    page = request.args.get('page', 1, type=int)
+    snap = current_snapshot()
+    minerals = snap.minerals
+    filtered_minerals = minerals
+    total = len(minerals)
+    if search_query:
+        with phase('filter'):
+            keys, total = snap.mineral_search.search(search_query, page, SEARCH_PAGE_SIZE)
+        filtered_minerals = {k: minerals[k] for k in keys if k in minerals}
+    # Allow researchers (or those with 'insights' permission) to add insights
+    if request.method == 'POST' and 'insight' in request.form:
+        message = add_insight('mineral', minerals)
+    page_insights, more_insights_url = insight_page('mineral')
+    return render_template('mineral_database.html', minerals=filtered_minerals, insights=page_insights, more_insights_url=more_insights_url, message=message, search_query=search_query, page=page, total=total, per_page=SEARCH_PAGE_SIZE)
+
+def export_rows(snap, kind):
+    # Row dicts for an export, generated lazily while the file is written
+    if kind == 'minerals':
+        return (dict(info, MineralName=name) for name, info in snap.minerals.items())
+    if kind == 'countries':
+        return (dict(info, CountryName=name) for name, info in snap.countries.items())
+    if kind == 'sites':
+        return (site.to_dict() for site in snap.sites)
+    return iter_records(snap.df, EXPORTS[kind]['columns'])
+
+def export_size(snap, kind):
+    return len({'minerals': snap.minerals, 'countries': snap.countries, 'sites': snap.sites}.get(kind, snap.df))
+
+def export_version(snap):
+    # Shared store versions are global; without a store the version is only meaningful per process
+    return str(snap.version) if store is not None else f"{_instance_token}-{snap.version}"
+
+# Exports that carry the data of a feature also need that feature's flag
+EXPORT_FLAGS = {'production': 'charts', 'sites': 'map'}
+
+# Only Researcher role may download exports
+@app.route('/download/<kind>.<fmt>')
+@render_pools.offload
+@requires(role='Researcher')
+def download_export(kind, fmt):
+    if kind not in EXPORTS or fmt not in FORMATS:
+        return jsonify({'error': 'unknown export'}), 404
+    if kind in EXPORT_FLAGS and not allows(current_mask(), BITS[EXPORT_FLAGS[kind]]):
+        return redirect(url_for('dashboard'))
+    snap = current_snapshot()
+    version = export_version(snap)
+    filename = f"{kind}.{fmt}"
+    cached = export_manager.cached(kind, fmt, version)
+    if cached:
+        return send_file(cached, mimetype=FORMATS[fmt], as_attachment=True, download_name=filename)
+    # Large exports (or ?async=1) are built in the background; poll the job endpoint
+    job_id = export_manager.job_id(kind, fmt, version)
+    running = export_manager.status(job_id) == 'running'
+    if running or request.args.get('async') == '1' or export_size(snap, kind) > export_manager.async_rows:
+        if not running:
+            export_manager.submit(kind, fmt, version, store_path=store.path if store is not None else None,
+                                  rows=export_rows(snap, kind))
+        return jsonify({'job_id': job_id, 'status': export_manager.status(job_id), 'status_url': url_for('export_job', job_id=job_id)}), 202
+    if fmt == 'csv':
+        return app.response_class(stream_with_context(export_manager.stream_csv(kind, export_rows(snap, kind), version)), mimetype=FORMATS[fmt], headers={"Content-Disposition": f"attachment;filename={filename}"})
+    with phase('export'):
+        path = render_pools.run('exports', export_manager.build, kind, fmt, export_rows(snap, kind), version)
+    return send_file(path, mimetype=FORMATS[fmt], as_attachment=True, download_name=filename)
+
+@app.route('/exports/jobs/<job_id>')
+@requires(role='Researcher', api=True)
+def export_job(job_id):
+    status = export_manager.status(job_id)
+    if status is None:
+        return jsonify({'job_id': job_id, 'status': 'unknown'}), 404
+    body = {'job_id': job_id, 'status': status}
+    if status == 'done':
+        kind, fmt, _ = export_manager.parse_job_id(job_id)
+        body['download_url'] = url_for('download_export', kind=kind, fmt=fmt)
+    return jsonify(body)
+
+# Download PDF of mineral data (researcher only)
+@app.route('/download/minerals.pdf')
+@render_pools.offload
+def download_minerals_pdf():
+    return download_export('minerals', 'pdf')
+
+# Download PDF of country data (researcher only)
+@app.route('/download/countries.pdf')
+@render_pools.offload
+def download_countries_pdf():
+    return download_export('countries', 'pdf')
+
+
+@app.route('/country_profiles', methods=['GET', 'POST'])
+@requires('profiles')
+def country_profiles():
+    message = None
+    search_query = request.args.get('search', '').strip().lower()
+    page = request.args.get('page', 1, type=int)
+    snap = current_snapshot()
+    countries = snap.countries
+    filtered_countries = countries
+    total = len(countries)
+    if search_query:
+        with phase('filter'):
+            keys, total = snap.country_search.search(search_query, page, SEARCH_PAGE_SIZE)
+        filtered_countries = {k: countries[k] for k in keys if k in countries}
+    # Allow researchers (or those with 'insights' permission) to add insights
+    if request.method == 'POST' and 'insight' in request.form:
+        message = add_insight('country', countries)
+    page_insights, more_insights_url = insight_page('country')
+    return render_template('country_profiles.html', countries=filtered_countries, country_stats=snap.analytics.country_summary, insights=page_insights, more_insights_url=more_insights_url, message=message, search_query=search_query, page=page, total=total, per_page=SEARCH_PAGE_SIZE)
+
+# Choose a modern color palette
+CHART_PALETTE = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
+
+# 'html' renders the figures into the page; 'client' sends figure JSON that the page
+# fetches in parallel and plots with the shared plotly.js (?mode= overrides per request)
+CHART_MODE = os.environ.get('CHART_MODE', 'html')
+
+def chart_positions(snap, mineral_filter, country_filter):
+    # Slice the pre-aggregated cube instead of copying/filtering df; the positions are only
+    # meaningful for this snapshot's cube and analytics
+    with phase('filter'):
+        positions = snap.production_cube.resolve(mineral_filter, country_filter)
+        # Fixed charts: Ensure data has names/values, fallback to full data if empty
+        if positions is None or not snap.production_cube.has_rows(*positions):
+            positions = (None, None)
+    return positions
+
+def chart_title(prefix, mineral_filter, country_filter):
+    return f'{prefix} {mineral_filter if mineral_filter != "all" else ""} in {country_filter if country_filter != "all" else ""}'
+
+def figure_production(snap, mineral_filter, country_filter, mi, ci):
+    # Production as bar (categorical)
+    fig = px.bar(snap.production_cube.frame(mi, ci), x='Year', y='Production_tonnes', color='mineral', barmode='group',
+                 title=chart_title('Production Trends', mineral_filter, country_filter),
+                 hover_data=['country', 'ExportValue_BillionUSD'], labels={'Production_tonnes': 'Tonnes'},
+                 color_discrete_sequence=CHART_PALETTE)
+    fig.update_layout(template='plotly_white')
+    return fig
+
+def figure_export(snap, mineral_filter, country_filter, mi, ci):
+    # Export as line (trends)
+    fig = px.line(snap.production_cube.frame(mi, ci), x='Year', y='ExportValue_BillionUSD', color='mineral',
+                  title=chart_title('Export Value Trends', mineral_filter, country_filter),
+                  hover_data=['country', 'Production_tonnes'], labels={'ExportValue_BillionUSD': 'Billion USD'},
+                  color_discrete_sequence=CHART_PALETTE)
+    fig.update_traces(mode='lines+markers')
+    fig.update_layout(template='plotly_white')
+    return fig
+
+def figure_share(snap, mineral_filter, country_filter, mi, ci):
+    # Additional chart 1: Production share pie by mineral (or country if mineral selected)
+    if mineral_filter == 'all':
+        names, values = snap.production_cube.share_by_mineral(mi, ci)
+        pie_title = 'Production Share by Mineral'
+    else:
+        names, values = snap.production_cube.share_by_country(mi, ci)
+        pie_title = 'Production Share by Country'
+    fig = px.pie(names=names, values=values, title=pie_title, color_discrete_sequence=CHART_PALETTE)
+    fig.update_layout(template='plotly_white')
+    return fig
+
+def figure_combo(snap, mineral_filter, country_filter, mi, ci):
+    # Additional chart 2: Combined production (bar) and export (line) over years
+    years, yearly = snap.production_cube.yearly(mi, ci)
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Bar(x=years, y=yearly['Production_tonnes'], name='Production (tonnes)', marker_color=CHART_PALETTE[0]))
+    fig.add_trace(go.Scatter(x=years, y=yearly['ExportValue_BillionUSD'], name='Export Value (B USD)', mode='lines+markers', marker_color=CHART_PALETTE[1]), secondary_y=True)
+    fig.update_layout(title_text='Production vs Export Value (Yearly)', template='plotly_white')
+    fig.update_xaxes(title_text='Year')
+    fig.update_yaxes(title_text='Production (tonnes)', secondary_y=False)
+    fig.update_yaxes(title_text='Export Value (B USD)', secondary_y=True)
+    return fig
+
+def figure_outlook(snap, mineral_filter, country_filter, mi, ci):
+    # Additional chart 3: production with its trend forecast (dashed) and year-over-year growth
+    years, series = snap.analytics.series(mi, ci)
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Scatter(x=years, y=series['Production_tonnes'], name='Production (tonnes)', mode='lines+markers', marker_color=CHART_PALETTE[0]))
+    if len(years):
+        # Join the forecast to the last actual point so the line is continuous
+        fig.add_trace(go.Scatter(x=[years[-1]] + series['forecast_years'].tolist(), y=[series['Production_tonnes'][-1]] + series['forecast_tonnes'].tolist(),
+                                 name='Trend forecast', mode='lines+markers', line={'dash': 'dash'}, marker_color=CHART_PALETTE[0]))
+    fig.add_trace(go.Bar(x=years, y=series['growth_tonnes'] * 100, name='YoY growth (%)', marker_color=CHART_PALETTE[2], opacity=0.5), secondary_y=True)
+    fig.update_layout(title_text=chart_title('Production Outlook', mineral_filter, country_filter), template='plotly_white')
+    fig.update_xaxes(title_text='Year', dtick=1)
+    fig.update_yaxes(title_text='Production (tonnes)', secondary_y=False)
+    fig.update_yaxes(title_text='YoY growth (%)', secondary_y=True)
+    return fig
+
+def figure_concentration(snap, mineral_filter, country_filter, mi, ci):
+    # Additional chart 4: production value (from market prices) and country concentration (HHI)
+    years, series = snap.analytics.series(mi, ci)
+    hhi_years, hhi_values = snap.analytics.concentration(mi)
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Bar(x=years, y=series['ProductionValue_USD'] / 1e9, name='Production value (B USD)', marker_color=CHART_PALETTE[3]))
+    hhi_name = f'HHI across countries ({mineral_filter})' if mi is not None else 'HHI of value across countries'
+    fig.add_trace(go.Scatter(x=hhi_years, y=hhi_values, name=hhi_name, mode='lines+markers', marker_color=CHART_PALETTE[4]), secondary_y=True)
+    fig.update_layout(title_text=chart_title('Production Value and Concentration', mineral_filter, country_filter), template='plotly_white')
+    fig.update_xaxes(title_text='Year', dtick=1)
+    fig.update_yaxes(title_text='Production value (B USD)', secondary_y=False)
+    fig.update_yaxes(title_text='HHI (0-10000)', range=[0, 10000], secondary_y=True)
+    return fig
+
+# Figure builders by name; the template's <name>_div slots and /api/charts/<name> use these names
+CHART_FIGURES = {'chart': figure_production, 'price': figure_export, 'pie': figure_share, 'combo': figure_combo,
+                 'outlook': figure_outlook, 'concentration': figure_concentration}
+
+def build_figure(snap, name, mineral_filter, country_filter):
+    mi, ci = chart_positions(snap, mineral_filter, country_filter)
+    with phase('figure'):
+        return CHART_FIGURES[name](snap, mineral_filter, country_filter, mi, ci)
+
+def render_chart_divs(snap, mineral_filter, country_filter):
+    # plotly.js itself is loaded once by the page, not embedded in every div
+    divs = {}
+    for name in CHART_FIGURES:
+        fig = build_figure(snap, name, mineral_filter, country_filter)
+        with phase('serialize'):
+            divs[f'{name}_div'] = fig.to_html(full_html=False, include_plotlyjs=False)
+    return divs
+
+def cached_chart_divs(snap, mineral_filter, country_filter):
+    # Keyed by the snapshot's own version, so an entry always matches the data it was drawn from
+    key = (snap.version, normalize_filter(mineral_filter), normalize_filter(country_filter))
+    return chart_cache.get_or_render(key, lambda: render_pools.run('charts', render_chart_divs, snap, key[1], key[2]))
+
+def warm_chart_cache():
+    # Pre-render the unfiltered charts and each single-filter view ('all' row and column) for the
+    # current data version; never more than the cache holds, so the warm-up cannot evict itself
+    snap = current_snapshot()
+    combinations = [('all', 'all')] + [(m, 'all') for m in snap.minerals] + [('all', c) for c in snap.countries]
+    for mineral_filter, country_filter in combinations[:chart_cache.maxsize]:
+        try:
+            cached_chart_divs(snap, mineral_filter, country_filter)
+        except Exception as e:
+            print(f"Error warming chart cache for {mineral_filter}/{country_filter}: {e}")
+
+@app.route('/interactive_charts')
+@render_pools.offload
+@requires('charts')
+def interactive_charts():
+    # Basic filters for interactivity (Appendix A)
+    mineral_filter = request.args.get('mineral', 'all')
+    country_filter = request.args.get('country', 'all')
+    snap = current_snapshot()
+    minerals, countries = list(snap.minerals.keys()), list(snap.countries.keys())
+    if request.args.get('mode', CHART_MODE) == 'client':
+        filters = {'mineral': normalize_filter(mineral_filter), 'country': normalize_filter(country_filter)}
+        figure_urls = {name: url_for('chart_figure', name=name, **filters) for name in CHART_FIGURES}
+        return render_template('interactive_charts.html', minerals=minerals, countries=countries, figure_urls=figure_urls)
+    divs = cached_chart_divs(snap, mineral_filter, country_filter)
+    return render_template('interactive_charts.html', minerals=minerals, countries=countries, figure_urls=None, **divs)
+
+@app.route('/api/charts/<name>')
+@render_pools.offload
+@requires('charts', api=True)
+def chart_figure(name):
+    # Figure JSON (numeric series as base64 typed arrays; orjson is used when installed)
+    if name not in CHART_FIGURES:
+        return jsonify({'error': 'unknown chart'}), 404
+    mineral_filter = normalize_filter(request.args.get('mineral'))
+    country_filter = normalize_filter(request.args.get('country'))
+    snap = current_snapshot()
+    def build():
+        fig = build_figure(snap, name, mineral_filter, country_filter)
+        with phase('serialize'):
+            return fig.to_json()
+    return api_response(snap, lambda: render_pools.run('charts', build), serialized=True)
+
+# plotly.js bundled with the plotly package, served once and cached by the browser
+def plotly_js_path():
+    return os.path.join(importlib.util.find_spec('plotly').submodule_search_locations[0], 'package_data', 'plotly.min.js')
+
+@app.route('/assets/plotly.min.js')
+def plotly_js():
+    return send_file(plotly_js_path(), mimetype='text/javascript', max_age=365 * 24 * 3600)
+
+@app.context_processor
+def plotly_js_url():
+    # Versioned URL so the year-long cache is busted when plotly is upgraded
+    return {'plotly_js_url': lambda: url_for('plotly_js', v=importlib.metadata.version('plotly'))}
+
+# Client-side layers injected into the cached map shell. The page selects what to show
+# through the shell's URL fragment: #mineral=<name> loads clustered sites for the viewport,
+# #preview=<lat>,<lon>&name=<site> shows a single marker (admin coordinate preview).
+SITE_LAYER_JS = """
+document.addEventListener('DOMContentLoaded', function() {
+    var map = %(map)s;
+    var layer = L.layerGroup().addTo(map);
+    var preview = L.layerGroup().addTo(map);
+    var base = %(url)s;
+    var url = null;
+    var fitted = false;
+    function load() {
+        if (!url) {
+            return;
+        }
+        var b = map.getBounds();
+        var query = url + '&zoom=' + map.getZoom();
+        if (fitted) {
+            query += '&bbox=' + [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()].join(',');
+        }
+        fetch(query, {credentials: 'same-origin'}).then(function(r) { return r.json(); }).then(function(data) {
+            if (!fitted) {
+                fitted = true;
+                if (data.bbox) {
+                    map.fitBounds([[data.bbox[1], data.bbox[0]], [data.bbox[3], data.bbox[2]]], {maxZoom: 9});
+                    return;
+                }
+            }
+            layer.clearLayers();
+            data.features.forEach(function(f) {
+                var ll = [f.geometry.coordinates[1], f.geometry.coordinates[0]];
+                var p = f.properties;
+                if (p.cluster) {
+                    L.circleMarker(ll, {radius: 12 + Math.min(24, Math.log(p.count) * 4), weight: 2, fillOpacity: 0.6})
+                        .bindTooltip(p.count + ' sites')
+                        .on('click', function() { map.setView(ll, map.getZoom() + 2); })
+                        .addTo(layer);
+                } else {
+                    var popup = document.createElement('div');
+                    popup.textContent = p.popup;
+                    L.marker(ll).bindPopup(popup).addTo(layer);
+                }
+            });
+        });
+    }
+    function apply() {
+        var params = new URLSearchParams(location.hash.slice(1));
+        layer.clearLayers();
+        preview.clearLayers();
+        if (params.has('preview')) {
+            url = null;
+            var at = params.get('preview').split(',').map(Number);
+            var popup = document.createElement('div');
+            popup.textContent = 'Preview: ' + (params.get('name') || '');
+            L.marker(at).bindPopup(popup).addTo(preview).openPopup();
+            map.setView(at, 9);
+            return;
+        }
+        url = base + '?mineral=' + encodeURIComponent(params.get('mineral') || 'all');
+        fitted = false;
+        load();
+    }
+    map.on('moveend', load);
+    window.addEventListener('hashchange', apply);
+    apply();
+});
+"""
+
+def site_popup(site):
+    return f"{site.get('SiteName','Unknown Site')} - {site.get('MineralName', 'Unknown')} in {site.get('CountryName', 'Unknown')} ({site.get('Production_tonnes', 'n/a')} tonnes)"
+
+_map_shell = None
+_map_shell_lock = threading.Lock()
+
+def render_map_shell():
+    with phase('figure'):
+        m = folium.Map(location=[0, 20], zoom_start=3, tiles=None, attr='Google Maps (English)')
+        # Google Satellite default (English labels, real imagery)
+        folium.TileLayer(tiles='https://mt1.google.com/vt/lyrs=s,h&x={x}&y={y}&z={z}&hl=en', 
+                         attr='Google Satellite (English)', name='Google Satellite (English)', overlay=False, control=True).add_to(m)
+        # Google Roadmap for streets (English)
+        folium.TileLayer(tiles='https://mt1.google.com/vt/lyrs=m&x={x}&y={y}&z={z}&hl=en', 
+                         attr='Google Roadmap (English)', name='Google Roadmap (English)', overlay=False, control=True).add_to(m)
+        folium.LayerControl().add_to(m)
+        # Sites are loaded lazily per viewport from /api/sites/clusters instead of one Marker per site
+        m.get_root().script.add_child(folium.Element(SITE_LAYER_JS % {'map': m.get_name(), 'url': json.dumps(url_for('site_clusters'))}))
+    with phase('serialize'):
+        return m.get_root().render().encode()
+
+def map_shell():
+    # The folium page (tile layers, layer control, Leaflet boilerplate) is the same for every
+    # request, so it is rendered once per process; only the fragment-driven layers vary
+    global _map_shell
+    with _map_shell_lock:
+        if _map_shell is None:
+            _map_shell = render_pools.run('maps', render_map_shell)
+        return _map_shell
+
+@app.route('/assets/map_shell.html')
+@render_pools.offload
+@requires('map')
+def map_shell_page():
+    # Versioned URL (see map_shell_url), so browsers may keep it for a year
+    response = app.response_class(map_shell(), mimetype='text/html')
+    response.cache_control.private = True
+    response.cache_control.max_age = 365 * 24 * 3600
+    return response
+
+@app.context_processor
+def map_shell_url():
+    # The shell only changes with its script or a folium upgrade
+    return {'map_shell_url': lambda: url_for('map_shell_page', v=f"{importlib.metadata.version('folium')}-{zlib.crc32(SITE_LAYER_JS.encode()):08x}")}
+
+@app.route('/geographical_map')
+@requires('map')
+def geographical_map():
+    # Basic filter for map (Appendix A: alternatives/deposits); the cached shell loads the sites
+    mineral_filter = request.args.get('mineral', 'all')
+    return render_template('geographical_map.html', mineral_filter=mineral_filter, minerals=list(current_snapshot().minerals.keys()))
+
+@app.route('/api/sites/clusters')
+@render_pools.offload
+@requires('map', api=True)
+def site_clusters():
+    mineral_filter = normalize_filter(request.args.get('mineral'))
+    mineral = None if mineral_filter == 'all' else mineral_filter
+    bbox = parse_bbox(request.args.get('bbox'))
+    zoom = request.args.get('zoom', 3, type=int)
+    sites = current_snapshot().sites
+    features = []
+    with phase('filter'):
+        clusters = sites.spatial.clusters(zoom, bbox, mineral)
+    for lat, lon, count, key in clusters:
+        if key is None:
+            properties = {'cluster': True, 'count': count}
+        else:
+            site = sites.get(key)
+            properties = {'cluster': False, 'count': 1, 'SiteID': key, 'popup': site_popup(site)}
+        features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': properties})
+    collection = {'type': 'FeatureCollection', 'features': features}
+    bounds = sites.spatial.bounds(mineral)
+    if bounds:
+        collection['bbox'] = [bounds[0][1], bounds[0][0], bounds[1][1], bounds[1][0]]
+    with phase('serialize'):
+        return jsonify(collection)
+
+# Prometheus scrape endpoint: admins (session) only, or scrapers sending
+# "Authorization: Bearer <token>" when METRICS_TOKEN is set
+@app.route('/metrics')
+def prometheus_metrics():
+    token = os.environ.get('METRICS_TOKEN')
+    scraper = bool(token) and request.headers.get('Authorization') == f'Bearer {token}'
+    if not scraper and not ('user' in session and current_mask() & ALL):
+        return jsonify({'error': 'unauthorized'}), 401
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# --- Read-only JSON API ----------------------------------------------------------
+# Same session permissions as the HTML views. Bodies are serialized once per data
+# version, carry a strong ETag per encoding (304 on If-None-Match) and are sent br/gzip-compressed.
+
+def api_response(snap, build, serialized=False):
+    # build() reads only from snap, the request's pinned snapshot
+    key = (snap.version, request.path, tuple(sorted(request.args.items(multi=True))))
+    def render():
+        payload = build()
+        with phase('serialize'):
+            return CachedResponse(payload, export_version(snap), serialized)
+    entry = api_cache.get_or_render(key, render)
+    encoding = negotiate(request.headers.get('Accept-Encoding'), size=len(entry.body))
+    headers = {'ETag': f'"{entry.etag(encoding)}"', 'Vary': 'Accept-Encoding', 'Cache-Control': 'private, no-cache'}
+    if entry.matches(request.if_none_match):
+        return app.response_class(status=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return app.response_class(entry.encoded(encoding), mimetype='application/json', headers=headers)
+
+def search_records(records, index, name_field):
+    search_query = request.args.get('search', '').strip().lower()
+    page = request.args.get('page', 1, type=int)
+    if not search_query:
+        names, total = list(records), len(records)
+    else:
+        with phase('filter'):
+            names, total = index.search(search_query, page, SEARCH_PAGE_SIZE)
+    items = [dict(records[n], **{name_field: n}) for n in names if n in records]
+    return {'total': total, 'page': page, 'per_page': SEARCH_PAGE_SIZE if search_query else total, 'items': items}
+
+@app.route('/api/minerals')
+@requires('database', api=True)
+def api_minerals():
+    snap = current_snapshot()
+    return api_response(snap, lambda: search_records(snap.minerals, snap.mineral_search, 'MineralName'))
+
+@app.route('/api/minerals/<path:name>')
+@requires('database', api=True)
+def api_mineral(name):
+    snap = current_snapshot()
+    if name not in snap.minerals:
+        return jsonify({'error': 'not found'}), 404
+    return api_response(snap, lambda: dict(snap.minerals[name], MineralName=name))
+
+@app.route('/api/countries')
+@requires('profiles', api=True)
+def api_countries():
+    snap = current_snapshot()
+    return api_response(snap, lambda: search_records(snap.countries, snap.country_search, 'CountryName'))
+
+@app.route('/api/countries/<path:name>')
+@requires('profiles', api=True)
+def api_country(name):
+    snap = current_snapshot()
+    if name not in snap.countries:
+        return jsonify({'error': 'not found'}), 404
+    return api_response(snap, lambda: dict(snap.countries[name], CountryName=name))
+
+@app.route('/api/sites')
+@requires('map', api=True)
+def api_sites():
+    mineral_filter = normalize_filter(request.args.get('mineral'))
+    snap = current_snapshot()
+    def build():
+        selected = snap.sites if mineral_filter == 'all' else snap.sites.for_mineral(mineral_filter)
+        return {'items': [site.to_dict() for site in selected]}
+    return api_response(snap, build)
+
+def production_positions(snap):
+    # (mineral filter, country filter, positions in snap's cube); unknown names select nothing
+    mineral_filter = normalize_filter(request.args.get('mineral'))
+    country_filter = normalize_filter(request.args.get('country'))
+    return mineral_filter, country_filter, snap.production_cube.resolve(mineral_filter, country_filter)
+
+@app.route('/api/production')
+@requires('charts', api=True)
+def api_production():
+    snap = current_snapshot()
+    mineral_filter, country_filter, positions = production_positions(snap)
+    def build():
+        body = {'mineral': mineral_filter, 'country': country_filter, 'years': []}
+        if positions is not None:
+            years, yearly = snap.production_cube.yearly(*positions)
+            body['years'] = years
+            body.update(yearly)
+        return body
+    return api_response(snap, build)
+
+@app.route('/api/production/aggregates')
+@requires('charts', api=True)
+def api_production_aggregates():
+    snap = current_snapshot()
+    mineral_filter, country_filter, positions = production_positions(snap)
+    def build():
+        body = {'mineral': mineral_filter, 'country': country_filter, 'by_mineral': {}, 'by_country': {}}
+        if positions is not None:
+            for measure in ('Production_tonnes', 'ExportValue_BillionUSD'):
+                names, values = snap.production_cube.share_by_mineral(*positions, measure=measure)
+                body['by_mineral'][measure] = dict(zip(names, values.tolist()))
+                names, values = snap.production_cube.share_by_country(*positions, measure=measure)
+                body['by_country'][measure] = dict(zip(names, values.tolist()))
+        return body
+    return api_response(snap, build)
+
+@app.route('/api/production/analytics')
+@requires('charts', api=True)
+def api_production_analytics():
+    # Precomputed per data version: value from market prices, YoY growth, trend forecast, HHI
+    snap = current_snapshot()
+    mineral_filter, country_filter, positions = production_positions(snap)
+    def build():
+        body = {'mineral': mineral_filter, 'country': country_filter, 'years': []}
+        if positions is not None:
+            years, series = snap.analytics.series(*positions)
+            body['years'] = years
+            body.update(series)
+            body['hhi_years'], body['hhi'] = snap.analytics.concentration(positions[0])
+        return body
+    return api_response(snap, build)
+
+render_pools.register(app)
+
+if os.environ.get('PRELOAD_BACKENDS', '').lower() in ('1', 'true', 'yes'):
+    backends.preload()
+    startup_mark('preload rendering backends')
+
+# Optional warm-up: CHART_CACHE_WARMUP=1 renders the single-filter chart views at startup
+if os.environ.get('CHART_CACHE_WARMUP', '').lower() in ('1', 'true', 'yes'):
+    threading.Thread(target=warm_chart_cache, name='chart-cache-warmup', daemon=True).start()
+
+# Hot reload: DATA_WATCH_INTERVAL seconds between data/*.csv polls (0 disables)
+if DATA_WATCH_INTERVAL > 0:
+    threading.Thread(target=watch_data_dir, name='data-watcher', daemon=True).start()
+
+def print_startup_profile():
+    # Import/load cost per step, then the cost each lazily-loaded backend would add
+    import resource
+    rows = list(STARTUP_TIMINGS)
+    rss_ready = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    for name in backends.BACKENDS:
+        if not backends.is_loaded(name):
+            backends.get(name)
+            rows.append((f"lazy import {name}", backends.import_timings[name]))
+    rss_loaded = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    width = max(len(step) for step, _ in rows)
+    print(f"{'step':<{width}}  {'ms':>9}")
+    for step, seconds in rows:
+        print(f"{step:<{width}}  {seconds * 1000:9.1f}")
+    print(f"{'ready to serve':<{width}}  {sum(t for _, t in STARTUP_TIMINGS) * 1000:9.1f}")
+    print(f"peak RSS at ready: {rss_ready:.1f} MB; with all backends loaded: {rss_loaded:.1f} MB")
+
+startup_mark('app ready')
+_startup_done = True
+
+if __name__ == '__main__':
+    if '--startup-profile' in sys.argv:
+        print_startup_profile()
+        sys.exit(0)
+    app.run(debug=True)
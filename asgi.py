@@ -0,0 +1,12 @@
+# ASGI entry point: uvicorn asgi:application (or SERVER_MODE=asgi gunicorn -c gunicorn.conf.py).
+# Light routes run on the event loop; views that may render run on a pool of ASGI_THREADS
+# threads, with chart, map and PDF renders capped by the app's render lanes (RENDER_LANES)
+# and kept below the pool size so cached charts and maps are still served during a burst.
+import os
+
+from app import app, render_pools
+from render_pool import AsgiApp
+
+threads = int(os.environ.get('ASGI_THREADS', 32))
+render_pools.size_for(threads)
+application = AsgiApp(app, threads=threads, offload=render_pools.endpoints)
@@ -0,0 +1,60 @@
+import importlib
+import threading
+import time
+
+
+# Rendering backends that are imported on first use instead of at app import.
+# name -> module path; lazy(name) returns a proxy so call sites keep using `px.bar(...)` etc.
+BACKENDS = {
+    'folium': 'folium',
+    'plotly.express': 'plotly.express',
+    'plotly.graph_objects': 'plotly.graph_objects',
+    'plotly.subplots': 'plotly.subplots',
+    'reportlab.canvas': 'reportlab.pdfgen.canvas',
+    'reportlab.pagesizes': 'reportlab.lib.pagesizes',
+}
+
+_modules = {}
+_lock = threading.Lock()
+import_timings = {}  # name -> seconds spent importing it (first load only)
+
+
+def get(name):
+    module = _modules.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        module = _modules.get(name)
+        if module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(BACKENDS.get(name, name))
+            import_timings[name] = time.perf_counter() - start
+            _modules[name] = module
+    return module
+
+
+def is_loaded(name):
+    return name in _modules
+
+
+def preload(names=None):
+    # Eagerly import backends, e.g. from a gunicorn post_fork/when_ready hook
+    for name in (names or BACKENDS):
+        get(name)
+    return dict(import_timings)
+
+
+class LazyBackend:
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get(self._name), attr)
+
+    def __repr__(self):
+        state = 'loaded' if is_loaded(self._name) else 'not loaded'
+        return f"<lazy backend {self._name!r} ({state})>"
+
+
+def lazy(name):
+    return LazyBackend(name)
@@ -0,0 +1,311 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+# Offline benchmark harness:
+#   python benchmark.py generate OUT_DIR [--scale small|medium|large] [--sites N] [--production N] [--minerals N]
+#   python benchmark.py run [--scale ...] [--repeat N] [--out results.json] [--store] [--snapshot]
+#   python benchmark.py compare BASE.json NEW.json
+# `run` generates data into a scratch directory laid out like a deployment (data/,
+# templates/, static/), starts the app in a fresh interpreter, times every route through
+# the Flask test client for each role, and writes machine-readable JSON.
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+SCALES = {
+    'small': {'minerals': 50, 'countries': 54, 'sites': 1000, 'production': 20000},
+    'medium': {'minerals': 500, 'countries': 54, 'sites': 5000, 'production': 200000},
+    'large': {'minerals': 5000, 'countries': 54, 'sites': 10000, 'production': 1000000},
+}
+YEARS = list(range(2005, 2025))
+
+# One login per role, matching the bundled roles.csv
+ROLE_USERS = [
+    (1, 'Administrator', 'bench_admin'),
+    (2, 'Investor', 'bench_investor'),
+    (3, 'Researcher', 'bench_researcher'),
+]
+
+# Routes taking arguments, with representative values (%(mineral)s / %(country)s are filled in)
+SAMPLE_ROUTES = [
+    '/mineral_database?search=mineral 1',
+    '/country_profiles?search=country',
+    '/interactive_charts?mineral=%(mineral)s',
+    '/interactive_charts?mineral=%(mineral)s&country=%(country)s',
+    '/interactive_charts?mineral=%(mineral)s&mode=client',
+    '/geographical_map?mineral=%(mineral)s',
+    '/api/sites/clusters?zoom=3',
+    '/api/sites/clusters?zoom=8&bbox=20,-10,30,0',
+    '/api/minerals?search=mineral',
+    '/api/minerals/%(mineral)s',
+    '/api/countries/%(country)s',
+    '/api/sites?mineral=%(mineral)s',
+    '/api/production?mineral=%(mineral)s',
+    '/api/production/aggregates',
+    '/api/production/analytics?mineral=%(mineral)s',
+    '/api/charts/chart?mineral=%(mineral)s',
+    '/api/charts/combo',
+    '/download/minerals.csv',
+    '/download/sites.csv',
+    '/download/production.csv',
+    '/download/minerals.pdf',
+    '/download/countries.pdf',
+]
+
+# Timed POSTs per role, run after its GETs: (label, path, form). Each repeat adds a site,
+# moves it and deletes it again, so later roles see the same data. %(i)s numbers the repeat.
+SAMPLE_POSTS = [
+    ('add_site', '/admin', {'action': 'add_site', 'site_name': 'Bench site %(user)s %(i)s', 'site_country': '%(country)s',
+                            'site_mineral': '%(mineral)s', 'latitude': '1.5', 'longitude': '20.5', 'production': '1000'}),
+    ('save_site_coords', '/admin', {'action': 'save_site_coords', 'site_name_edit': 'Bench site %(user)s %(i)s',
+                                    'edit_latitude': '2.5', 'edit_longitude': '21.5'}),
+    ('delete_site', '/admin', {'action': 'delete_site', 'site_name': 'Bench site %(user)s %(i)s'}),
+    ('insight', '/mineral_database', {'insight': 'Benchmark insight %(i)s', 'subject': '%(mineral)s'}),
+    ('insight', '/country_profiles', {'insight': 'Benchmark insight %(i)s', 'subject': '%(country)s'}),
+]
+
+
+def generate(out_dir, minerals=50, countries=54, sites=1000, production=20000, seed=42):
+    # Deterministic synthetic data/*.csv shaped like the bundled files
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    mineral_ids = np.arange(1, minerals + 1)
+    pd.DataFrame({
+        'MineralID': mineral_ids,
+        'MineralName': [f'Mineral {i}' for i in mineral_ids],
+        'Description': [f'Synthetic mineral {i} used in batteries, alloys and electronics' for i in mineral_ids],
+        'MarketPriceUSD_per_tonne': rng.integers(500, 200000, minerals),
+        'ImageURL': '',
+    }).to_csv(os.path.join(out_dir, 'minerals.csv'), index=False)
+    # Replace any bundled extra minerals, whose IDs would collide with the synthetic ones
+    pd.DataFrame(columns=['MineralID', 'MineralName', 'Description', 'MarketPriceUSD_per_tonne']).to_csv(
+        os.path.join(out_dir, 'extra_minerals.csv'), index=False)
+    country_ids = np.arange(1, countries + 1)
+    pd.DataFrame({
+        'CountryID': country_ids,
+        'CountryName': [f'Country {i}' for i in country_ids],
+        'GDP_BillionUSD': rng.integers(1, 500, countries),
+        'MiningRevenue_BillionUSD': rng.integers(1, 50, countries),
+        'KeyProjects': [f'Project {i} mine' for i in country_ids],
+    }).to_csv(os.path.join(out_dir, 'countries.csv'), index=False)
+    site_ids = np.arange(1, sites + 1)
+    pd.DataFrame({
+        'SiteID': site_ids,
+        'SiteName': [f'Site {i}' for i in site_ids],
+        'CountryID': rng.integers(1, countries + 1, sites),
+        'MineralID': rng.integers(1, minerals + 1, sites),
+        'Latitude': np.round(rng.uniform(-34, 37, sites), 6),   # roughly Africa
+        'Longitude': np.round(rng.uniform(-17, 51, sites), 6),
+        'Production_tonnes': rng.integers(100, 500000, sites),
+    }).to_csv(os.path.join(out_dir, 'sites.csv'), index=False)
+    pd.DataFrame({
+        'StatID': np.arange(1, production + 1),
+        'Year': rng.choice(YEARS, production),
+        'CountryID': rng.integers(1, countries + 1, production),
+        'MineralID': rng.integers(1, minerals + 1, production),
+        'Production_tonnes': rng.integers(100, 1000000, production),
+        'ExportValue_BillionUSD': np.round(rng.uniform(0.01, 20, production), 2),
+    }).to_csv(os.path.join(out_dir, 'production_stats.csv'), index=False)
+    shutil.copy(os.path.join(REPO, 'roles.csv'), os.path.join(out_dir, 'roles.csv'))
+    pd.DataFrame({
+        'UserID': [i for i, _, _ in ROLE_USERS],
+        'Username': [u for _, _, u in ROLE_USERS],
+        'PasswordHash': 'bench',
+        'RoleID': [i for i, _, _ in ROLE_USERS],
+        'Email': [f'{u}@example.com' for _, _, u in ROLE_USERS],
+    }).to_csv(os.path.join(out_dir, 'users.csv'), index=False)
+    return out_dir
+
+
+def prepare_workdir(work, data_args):
+    # Deployment layout next to a copy of the code (Flask resolves templates/ and static/
+    # relative to app.py): modules, templates/ and static/ from the repo, generated data/
+    templates = os.path.join(work, 'templates')
+    static = os.path.join(work, 'static')
+    os.makedirs(templates, exist_ok=True)
+    os.makedirs(static, exist_ok=True)
+    for name in os.listdir(REPO):
+        if name.endswith('.py'):
+            shutil.copy(os.path.join(REPO, name), work)
+        elif name.endswith('.html'):
+            shutil.copy(os.path.join(REPO, name), templates)
+        elif name.endswith('.css'):
+            shutil.copy(os.path.join(REPO, name), static)
+    for sub in ('templates', 'static'):
+        if os.path.isdir(os.path.join(REPO, sub)):
+            shutil.copytree(os.path.join(REPO, sub), os.path.join(work, sub), dirs_exist_ok=True)
+    generate(os.path.join(work, 'data'), **data_args)
+
+
+def _summary(samples):
+    ms = np.asarray(samples) * 1000
+    return {'first_ms': round(float(ms[0]), 3), 'median_ms': round(float(np.median(ms)), 3),
+            'p95_ms': round(float(np.percentile(ms, 95)), 3), 'min_ms': round(float(ms.min()), 3)}
+
+
+def worker(repeat):
+    # Runs inside the scratch directory in a fresh interpreter; prints one JSON document
+    import resource
+    sys.path.insert(0, os.getcwd())
+    started = time.perf_counter()
+    import app as app_module
+    startup_s = time.perf_counter() - started
+    rss_startup = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    flask_app = app_module.app
+    mineral = next(iter(app_module.current_snapshot().minerals), 'all')
+    country = next(iter(app_module.current_snapshot().countries), 'all')
+    paths = sorted(r.rule for r in flask_app.url_map.iter_rules()
+                   if 'GET' in r.methods and not r.arguments and r.endpoint not in ('static', 'logout'))
+    paths += [p % {'mineral': mineral, 'country': country} for p in SAMPLE_ROUTES]
+    paths = list(dict.fromkeys(paths))
+    routes = []
+    for _, role, username in ROLE_USERS:
+        client = flask_app.test_client()
+        t = time.perf_counter()
+        response = client.post('/login', data={'username': username, 'password': 'bench'})
+        routes.append(dict({'role': role, 'route': 'POST /login', 'status': response.status_code,
+                            'bytes': len(response.data)}, **_summary([time.perf_counter() - t])))
+        for path in paths:
+            samples = []
+            for _ in range(repeat):
+                t = time.perf_counter()
+                response = client.get(path)
+                body = response.data  # includes streamed bodies
+                samples.append(time.perf_counter() - t)
+            routes.append(dict({'role': role, 'route': path, 'status': response.status_code,
+                                'bytes': len(body)}, **_summary(samples)))
+        samples = [[] for _ in SAMPLE_POSTS]
+        last = [None] * len(SAMPLE_POSTS)
+        for i in range(repeat):
+            values = {'mineral': mineral, 'country': country, 'user': username, 'i': i}
+            for n, (_, path, form) in enumerate(SAMPLE_POSTS):
+                t = time.perf_counter()
+                response = client.post(path, data={k: v % values for k, v in form.items()})
+                body = response.data
+                samples[n].append(time.perf_counter() - t)
+                last[n] = response.status_code, len(body)
+        for (label, path, _), timings, (status, size) in zip(SAMPLE_POSTS, samples, last):
+            routes.append(dict({'role': role, 'route': f'POST {path} {label}', 'status': status,
+                                'bytes': size}, **_summary(timings)))
+    json.dump({
+        'startup_s': round(startup_s, 4),
+        'startup_steps_ms': {step: round(seconds * 1000, 3) for step, seconds in app_module.STARTUP_TIMINGS},
+        'rss_startup_bytes': rss_startup,
+        'rss_peak_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'routes': routes,
+    }, sys.stdout)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(data_args, repeat=5, store=False, snapshot=False, keep=None):
+    work = keep or tempfile.mkdtemp(prefix='minerals-bench-')
+    try:
+        t = time.perf_counter()
+        prepare_workdir(work, data_args)
+        generate_s = time.perf_counter() - t
+        env = dict(os.environ,
+                   DATA_STORE=os.path.join(work, 'data', 'bench.db') if store else 'none',
+                   DATA_SNAPSHOT=os.path.join(work, 'data', 'snapshot') if snapshot else 'none',
+                   DATA_WATCH_INTERVAL='0', CHART_CACHE_WARMUP='', PRELOAD_BACKENDS='',
+                   EXPORT_CACHE_DIR=os.path.join(work, 'data', 'exports'))
+        if snapshot:
+            subprocess.run([sys.executable, os.path.join(work, 'columnar.py'), 'build'], cwd=work, env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+        proc = subprocess.run([sys.executable, os.path.join(work, 'benchmark.py'), '_worker', str(repeat)],
+                              cwd=work, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"benchmark worker failed:\n{proc.stderr}")
+        # The app may print to stdout while loading; the JSON document is the last line
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        if keep is None:
+            shutil.rmtree(work, ignore_errors=True)
+    return dict({
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'data': data_args,
+        'repeat': repeat,
+        'store': store,
+        'snapshot': snapshot,
+        'generate_s': round(generate_s, 3),
+    }, **result)
+
+
+def compare(base, new):
+    # Median latency per (role, route), slowest regressions first
+    key = lambda r: (r['role'], r['route'])
+    before = {key(r): r for r in base['routes']}
+    rows = []
+    for r in new['routes']:
+        old = before.get(key(r))
+        if old and old['median_ms'] > 0:
+            rows.append((r['median_ms'] / old['median_ms'], r, old))
+    rows.sort(key=lambda row: -row[0])
+    print(f"startup: {base['startup_s']:.3f}s -> {new['startup_s']:.3f}s; "
+          f"peak RSS: {base['rss_peak_bytes'] / 2**20:.1f} -> {new['rss_peak_bytes'] / 2**20:.1f} MB")
+    width = max((len(f'{r["role"]} {r["route"]}') for _, r, _ in rows), default=10)
+    for ratio, r, old in rows:
+        print(f"{r['role'] + ' ' + r['route']:<{width}}  {old['median_ms']:9.2f} -> {r['median_ms']:9.2f} ms  x{ratio:.2f}")
+
+
+def _option(args, flag, default=None, cast=str):
+    if flag in args:
+        i = args.index(flag)
+        value = args[i + 1]
+        del args[i:i + 2]
+        return cast(value)
+    return default
+
+
+def _data_args(args):
+    data_args = dict(SCALES[_option(args, '--scale', 'small')])
+    for name in ('minerals', 'countries', 'sites', 'production'):
+        data_args[name] = _option(args, f'--{name}', data_args[name], int)
+    data_args['seed'] = _option(args, '--seed', 42, int)
+    return data_args
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    command = args.pop(0) if args else None
+    if command == '_worker':
+        worker(int(args[0]))
+    elif command == 'generate' and args:
+        out_dir = args.pop(0)
+        generate(out_dir, **_data_args(args))
+        print(f"Wrote synthetic CSVs to {out_dir}")
+    elif command == 'run':
+        out = _option(args, '--out')
+        repeat = _option(args, '--repeat', 5, int)
+        keep = _option(args, '--keep')
+        store, snapshot = '--store' in args, '--snapshot' in args
+        result = run(_data_args(args), repeat=repeat, store=store, snapshot=snapshot, keep=keep)
+        text = json.dumps(result, indent=1)
+        if out:
+            with open(out, 'w') as f:
+                f.write(text + '\n')
+            print(f"Wrote {out}")
+        else:
+            print(text)
+    elif command == 'compare' and len(args) == 2:
+        with open(args[0]) as a, open(args[1]) as b:
+            compare(json.load(a), json.load(b))
+    else:
+        print("usage: python benchmark.py generate OUT_DIR [--scale small|medium|large] [--minerals N] [--countries N] [--sites N] [--production N] [--seed N]\n"
+              "       python benchmark.py run [--scale ...] [--repeat N] [--out FILE] [--store] [--snapshot] [--keep DIR]\n"
+              "       python benchmark.py compare BASE.json NEW.json")
+        sys.exit(2)
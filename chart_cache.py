@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+
+
+class _Flight:
+    # One in-progress render that concurrent misses for the same key wait on
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Bounded LRU cache for rendered chart fragments.
+# Keys are (data_version, mineral, country) so a data change never serves stale charts.
+class ChartCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = max(1, int(maxsize))
+        self._entries = OrderedDict()
+        self._inflight = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_render(self, key, render):
+        value = self.get(key)
+        if value is not None:
+            return value
+        # Single flight: the first miss renders, concurrent misses for the key wait for it
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            # Render outside the lock so slow renders don't block other readers
+            flight.value = render()
+            self.put(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def discard_older(self, version):
+        # Drop entries rendered for an older data version
+        with self._lock:
+            for key in [k for k in self._entries if k[0] != version]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0.0,
+            }
+
+
+def normalize_filter(value):
+    # Treat missing/blank filters as 'all' so equivalent URLs share a cache entry
+    value = (value or '').strip()
+    return value if value else 'all'
@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+from data_loader import merge_names
+from site_index import normalize_coords
+from storage import TABLES, csv_fingerprint, open_store, read_csv_table
+
+# Prebuilt, already-joined columnar copy of the data tables for fast startup.
+# One .npy file per column (memory-mapped read-only, so worker processes share the
+# same pages) plus manifest.json recording the source it was built from. Text columns
+# are dictionary-encoded: int32 codes (-1 = missing) + a fixed-width string array.
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+
+def current_source(store=None, data_dir='data'):
+    # What a snapshot must have been built from to be current
+    if store is not None:
+        return {'store_version': store.version()}
+    return {'csv': {table: csv_fingerprint(data_dir, table) for table in TABLES}}
+
+
+def compile_tables(read_table):
+    # Read every table and resolve names/coordinates once, the way load_data would
+    frames = {}
+    for table in TABLES:
+        try:
+            frames[table] = read_table(table)
+        except FileNotFoundError:
+            continue
+    minerals = frames['minerals'].set_index('MineralName').to_dict('index') if 'minerals' in frames else {}
+    countries = frames['countries'].set_index('CountryName').to_dict('index') if 'countries' in frames else {}
+    if 'production_stats' in frames:
+        frames['production_stats'] = merge_names(frames['production_stats'], minerals, countries, 'mineral', 'country')
+    if 'sites' in frames:
+        sites = merge_names(frames['sites'], minerals, countries, 'MineralName', 'CountryName')
+        coords = [normalize_coords(lat, lon) for lat, lon in zip(sites['Latitude'], sites['Longitude'])]
+        valid = np.array([c is not None for c in coords], dtype=bool)
+        if valid.any():
+            fixed = np.array([c for c in coords if c is not None], dtype=np.float64)
+            sites.loc[valid, 'Latitude'] = fixed[:, 0]
+            sites.loc[valid, 'Longitude'] = fixed[:, 1]
+        frames['sites'] = sites
+    return frames
+
+
+def _encode_column(series, path):
+    # Numeric columns are stored as-is; everything else is dictionary-encoded
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        np.save(path + '.npy', series.to_numpy())
+        return {'kind': 'numeric'}
+    codes, uniques = pd.factorize(series.astype(object).where(series.notna(), None), use_na_sentinel=True)
+    np.save(path + '.codes.npy', codes.astype(np.int32))
+    np.save(path + '.values.npy', np.asarray([str(v) for v in uniques], dtype=str))
+    return {'kind': 'text'}
+
+
+def write_snapshot(path, frames, source):
+    # Write into a temporary directory and swap it in, so readers never see a partial snapshot
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    manifest = {'format': FORMAT_VERSION, 'source': source, 'tables': {}}
+    for table, frame in frames.items():
+        os.makedirs(os.path.join(tmp, table))
+        columns = []
+        for i, column in enumerate(frame.columns):
+            spec = _encode_column(frame[column], os.path.join(tmp, table, str(i)))
+            columns.append(dict(spec, name=column, file=str(i)))
+        manifest['tables'][table] = {'rows': len(frame), 'columns': columns}
+    with open(os.path.join(tmp, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+    old = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+class ColumnarSnapshot:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+    @property
+    def source(self):
+        return self.manifest.get('source')
+
+    def is_current(self, source):
+        return self.manifest.get('format') == FORMAT_VERSION and self.source == source
+
+    def frame(self, table):
+        spec = self.manifest['tables'].get(table)
+        if spec is None:
+            raise FileNotFoundError(f"table {table} is not in the snapshot")
+        numeric, text = {}, []
+        for i, column in enumerate(spec['columns']):
+            base = os.path.join(self.path, table, column['file'])
+            if column['kind'] == 'numeric':
+                numeric[column['name']] = np.load(base + '.npy', mmap_mode='r')
+            else:
+                codes = np.load(base + '.codes.npy', mmap_mode='r')
+                values = np.append(np.load(base + '.values.npy').astype(object), None)
+                text.append((i, column['name'], values[codes]))  # code -1 picks the trailing None
+        # Numeric columns stay backed by the shared, read-only mapping (no copy); text
+        # columns are inserted afterwards so pandas does not consolidate them together
+        frame = pd.DataFrame(numeric, index=pd.RangeIndex(spec['rows']), copy=False)
+        for i, name, values in text:
+            frame.insert(i, name, values)
+        return frame
+
+
+def open_snapshot(path, source):
+    # The snapshot at path if it was built from `source`, else None (callers fall back to CSV/store reads)
+    if not path or not os.path.exists(os.path.join(path, MANIFEST)):
+        return None
+    try:
+        snapshot = ColumnarSnapshot(path)
+    except Exception as e:
+        print(f"Error opening columnar snapshot {path}: {e}")
+        return None
+    if not snapshot.is_current(source):
+        print(f"Columnar snapshot {path} is stale; loading from source (rebuild with: python columnar.py build)")
+        return None
+    return snapshot
+
+
+def build(path, data_dir='data', store=None):
+    # Compile the current tables into a snapshot; with a store, retry if it changes mid-build
+    while True:
+        source = current_source(store, data_dir)
+        if store is not None:
+            frames = compile_tables(lambda table: store.frame(table) if store.has_table(table) else read_csv_table(data_dir, table))
+        else:
+            frames = compile_tables(lambda table: read_csv_table(data_dir, table))
+        if current_source(store, data_dir) == source:
+            return write_snapshot(path, frames, source)
+
+
+if __name__ == '__main__':
+    import sys
+    # python columnar.py build [data_dir] [--out path] [--db path|none]
+    args = sys.argv[1:]
+    out = os.environ.get('DATA_SNAPSHOT', 'data/snapshot')
+    db = os.environ.get('DATA_STORE', 'data/minerals_app.db')
+    for flag in ('--out', '--db'):
+        if flag in args:
+            i = args.index(flag)
+            if flag == '--out':
+                out = args[i + 1]
+            else:
+                db = args[i + 1]
+            del args[i:i + 2]
+    if not args or args[0] != 'build':
+        print("usage: python columnar.py build [data_dir] [--out path] [--db path|none]")
+        sys.exit(2)
+    data_dir = args[1] if len(args) > 1 else 'data'
+    store = open_store(db)
+    if store is not None:
+        store.import_csvs(data_dir)
+    manifest = build(out, data_dir, store)
+    rows = ', '.join(f"{t}={spec['rows']}" for t, spec in manifest['tables'].items())
+    print(f"Wrote {out} ({rows})")
@@ -0,0 +1,326 @@
+import copy
+import threading
+import pandas as pd
+
+from production_cube import ProductionCube
+from search_index import SearchIndex
+from site_registry import SiteRecord, SiteRegistry
+from storage import TABLES, csv_fingerprint
+from permissions import RoleTable
+
+# Searchable fields and their ranking weights
+MINERAL_SEARCH_FIELDS = {'MineralName': 3.0, 'Description': 1.0}
+COUNTRY_SEARCH_FIELDS = {'CountryName': 3.0, 'KeyProjects': 1.0}
+
+
+# Everything the views read, built from one consistent set of tables.
+# A reload builds a new Snapshot (sharing unchanged parts with the old one) and the
+# app swaps it in as a whole; version is the data version it was published under.
+class Snapshot:
+    FIELDS = ('minerals', 'countries', 'df', 'production_cube', 'users', 'role_table',
+              'sites', 'mineral_search', 'country_search')
+
+    def __init__(self, **parts):
+        for field in self.FIELDS:
+            setattr(self, field, parts.pop(field))
+        self.version = parts.pop('version', 0)
+        self.analytics = parts.pop('analytics', None)  # derived metrics, rebuilt by the app on publish
+
+    def replace(self, **changes):
+        snap = copy.copy(self)
+        for field, value in changes.items():
+            setattr(snap, field, value)
+        return snap
+
+
+def _names_by_id(records, id_col):
+    # {MineralID: MineralName} from the name-keyed minerals/countries dicts
+    return {info.get(id_col): name for name, info in records.items() if pd.notna(info.get(id_col))}
+
+
+def merge_names(frame, minerals, countries, mineral_col, country_col):
+    frame = frame.copy()
+    frame[mineral_col] = frame['MineralID'].map(_names_by_id(minerals, 'MineralID')) if 'MineralID' in frame.columns else None
+    frame[country_col] = frame['CountryID'].map(_names_by_id(countries, 'CountryID')) if 'CountryID' in frame.columns else None
+    return frame
+
+
+def build_snapshot(read_table, mark=lambda step: None, joined=False):
+    # Full build from read_table(name) -> DataFrame (store, CSVs or a columnar snapshot).
+    # joined=True means production_stats/sites already carry resolved mineral/country names.
+    try:
+        minerals = read_table('minerals').set_index('MineralName').to_dict('index')  # minerals.csv + extra_minerals.csv (XLSX data)
+    except Exception as e:
+        print(f"Error loading minerals: {e}")
+        minerals = {}  # Fallback empty dict
+    mark('load minerals')
+
+    try:
+        countries = read_table('countries').set_index('CountryName').to_dict('index')
+    except Exception as e:
+        print(f"Error loading countries: {e}")
+        countries = {}
+    mark('load countries')
+
+    try:
+        df = read_table('production_stats')
+        if not joined:
+            df = merge_names(df, minerals, countries, 'mineral', 'country')
+    except Exception as e:
+        print(f"Error loading production: {e}")
+        df = pd.DataFrame()  # Empty DF
+    mark('load production stats')
+
+    # Pre-aggregated (year, mineral, country) arrays used by the charts
+    try:
+        production_cube = ProductionCube.from_frame(df) if not df.empty else ProductionCube()
+    except Exception as e:
+        print(f"Error building production cube: {e}")
+        production_cube = ProductionCube()
+    mark('build production cube')
+
+    try:
+        users = read_table('users').set_index('Username').to_dict('index')
+    except Exception as e:
+        print(f"Error loading users: {e}")
+        users = {}
+    mark('load users')
+
+    try:
+        role_table = RoleTable.from_frame(read_table('roles'))
+    except Exception as e:
+        print(f"Error loading roles: {e}")
+        role_table = RoleTable()
+    mark('load roles')
+
+    try:
+        sites_df = read_table('sites')
+        if not joined:
+            sites_df = merge_names(sites_df, minerals, countries, 'MineralName', 'CountryName')
+        # Keyed registry; validation, lat/lon swaps and spatial indexing happen here, once per site
+        sites = SiteRegistry.from_records(sites_df.to_dict('records'))
+    except Exception as e:
+        print(f"Error loading sites: {e}")
+        sites = SiteRegistry()
+    mark('load sites')
+
+    # Inverted indexes behind the mineral/country search boxes
+    mineral_search = SearchIndex(MINERAL_SEARCH_FIELDS)
+    for name, info in minerals.items():
+        mineral_search.add(name, dict(info, MineralName=name))
+    country_search = SearchIndex(COUNTRY_SEARCH_FIELDS)
+    for name, info in countries.items():
+        country_search.add(name, dict(info, CountryName=name))
+    mark('build search indexes')
+
+    return Snapshot(minerals=minerals, countries=countries, df=df, production_cube=production_cube,
+                    users=users, role_table=role_table, sites=sites,
+                    mineral_search=mineral_search, country_search=country_search)
+
+
+# --- diffing ----------------------------------------------------------------
+
+class Delta:
+    def __init__(self, upserts, deleted, previous):
+        self.upserts = upserts      # new/changed rows (full rows from the new table)
+        self.deleted = deleted      # keys no longer present
+        self.previous = previous    # old rows (indexed by key) for every changed or deleted key
+
+    def __bool__(self):
+        return bool(len(self.upserts) or len(self.deleted))
+
+    def __repr__(self):
+        return f"<Delta {len(self.upserts)} upserted, {len(self.deleted)} deleted>"
+
+
+def diff_frames(old, new, key):
+    # Rows of `new` that are added or differ from `old` (by key), and keys that disappeared.
+    # Only columns present in `new` are compared; NaN equals NaN.
+    new = new.dropna(subset=[key]).drop_duplicates(key, keep='last')
+    if old is None or old.empty or key not in old.columns:
+        return Delta(new.reset_index(drop=True), [], pd.DataFrame(columns=new.columns).set_index(key))
+    old = old.dropna(subset=[key]).drop_duplicates(key, keep='last').set_index(key, drop=False)
+    new_idx = new.set_index(key, drop=False)
+    deleted = old.index.difference(new_idx.index)
+    common = new_idx.index.intersection(old.index)
+    columns = list(new_idx.columns)
+    a = new_idx.loc[common, columns]
+    b = old.reindex(index=common, columns=columns)
+    same = ((a == b) | (a.isna() & b.isna())).all(axis=1)
+    changed = common[~same.to_numpy()]
+    added = new_idx.index.difference(old.index)
+    upserts = new_idx.loc[new_idx.index.isin(changed.union(added))].reset_index(drop=True)
+    previous = old.loc[changed.union(deleted)]
+    return Delta(upserts, list(deleted), previous)
+
+
+def table_frame(snap, table):
+    # The rows a snapshot currently holds for `table`, shaped like the source table
+    if table == 'minerals':
+        return pd.DataFrame([dict(info, MineralName=name) for name, info in snap.minerals.items()])
+    if table == 'countries':
+        return pd.DataFrame([dict(info, CountryName=name) for name, info in snap.countries.items()])
+    if table == 'production_stats':
+        return snap.df.drop(columns=['mineral', 'country'], errors='ignore')
+    if table == 'sites':
+        return pd.DataFrame([site.to_dict() for site in snap.sites])
+    if table == 'users':
+        return pd.DataFrame([dict(info, Username=name) for name, info in snap.users.items()])
+    raise KeyError(table)
+
+
+# --- applying a changed table to a snapshot ------------------------------------
+
+def apply_table(snap, table, frame):
+    # New snapshot with `table` replaced by `frame`, touching only the rows that differ.
+    # Returns (snapshot, delta); the old snapshot is left untouched.
+    if table == 'roles':
+        role_table = RoleTable.from_frame(frame)
+        unchanged = (role_table.version, role_table.names) == (snap.role_table.version, snap.role_table.names)
+        return (snap, None) if unchanged else (snap.replace(role_table=role_table), None)
+    if table == 'users':
+        users = frame.set_index('Username').to_dict('index')
+        return (snap, None) if users == snap.users else (snap.replace(users=users), None)
+    delta = diff_frames(table_frame(snap, table), frame, TABLES[table]['key'])
+    return _apply_delta(snap, table, delta), delta
+
+
+def apply_rows(snap, table, upserts=(), deleted=()):
+    # New snapshot with individual rows of `table` upserted (full rows, key included) or
+    # deleted by key: the admin's edits, applied exactly as a reload of the table would be
+    key = TABLES[table]['key']
+    upserts = pd.DataFrame(list(upserts))
+    deleted = list(deleted)
+    previous = _current_rows(snap, table, key, (list(upserts[key]) if len(upserts) else []) + deleted)
+    if upserts.empty:
+        upserts = previous.iloc[:0].reset_index(drop=True)
+    return _apply_delta(snap, table, Delta(upserts, [k for k in deleted if k in previous.index], previous))
+
+
+def next_key(snap, table):
+    # Key for a new row when there is no store to assign one
+    if table == 'sites':
+        return snap.sites.next_id()
+    keys = pd.to_numeric(table_frame(snap, table).get(TABLES[table]['key']), errors='coerce')
+    return 1 if keys is None or keys.isna().all() else int(keys.max()) + 1
+
+
+def _current_rows(snap, table, key, keys):
+    # The snapshot's rows for `keys`, indexed by key (the `previous` side of a Delta)
+    if table == 'sites':
+        rows = pd.DataFrame([site.to_dict() for site in map(snap.sites.get, keys) if site is not None])
+    else:
+        rows = table_frame(snap, table)
+        rows = rows[rows[key].isin(keys)] if key in rows.columns else rows.iloc[:0]
+    if key not in rows.columns:
+        return pd.DataFrame(columns=[key]).set_index(key)
+    return rows.set_index(key, drop=False)
+
+
+def _apply_delta(snap, table, delta):
+    if not delta:
+        return snap
+    if table == 'minerals':
+        snap = _apply_named(snap, delta, 'minerals', 'mineral_search', 'MineralID', 'MineralName')
+    elif table == 'countries':
+        snap = _apply_named(snap, delta, 'countries', 'country_search', 'CountryID', 'CountryName')
+    elif table == 'production_stats':
+        snap = _apply_production(snap, delta)
+    elif table == 'sites':
+        snap = _apply_sites(snap, delta)
+    return snap
+
+
+def _apply_named(snap, delta, attr, search_attr, id_col, name_col):
+    # minerals/countries: name-keyed dict + search index, relabelling dependents on renames
+    records = dict(getattr(snap, attr))
+    search = getattr(snap, search_attr).copy()
+    new_names = dict(zip(delta.upserts[id_col], delta.upserts[name_col]))
+    renamed = {}
+    for key, old in delta.previous.iterrows():
+        old_name = old.get(name_col)
+        if new_names.get(key) != old_name:
+            records.pop(old_name, None)
+            search.remove(old_name)
+            renamed[key] = new_names.get(key)
+    for row in delta.upserts.to_dict('records'):
+        name = row.pop(name_col)
+        records[name] = row  # same name keeps its position in the dict
+        search.add(name, dict(row, **{name_col: name}))
+    # New IDs may name rows that were previously unlabelled
+    for key in set(new_names) - set(delta.previous.index):
+        renamed[key] = new_names[key]
+    snap = snap.replace(**{attr: records, search_attr: search})
+    if renamed:
+        snap = _relabel(snap, id_col, renamed)
+    return snap
+
+
+def _relabel(snap, id_col, names):
+    # Rewrite mineral/country names on production rows and sites after a rename (rare)
+    df, sites = snap.df, snap.sites
+    label_col = 'mineral' if id_col == 'MineralID' else 'country'
+    site_col = 'MineralName' if id_col == 'MineralID' else 'CountryName'
+    if not df.empty and id_col in df.columns:
+        mask = df[id_col].isin(list(names))
+        if mask.any():
+            df = df.copy()
+            df.loc[mask, label_col] = df.loc[mask, id_col].map(names)
+            snap = snap.replace(df=df, production_cube=ProductionCube.from_frame(df))
+    touched = [site for site in sites if site.get(id_col) in names]
+    if touched:
+        sites = sites.copy()
+        for site in touched:
+            values = site.to_dict()
+            values[site_col] = names[site.get(id_col)]
+            sites.add(SiteRecord(**values))
+        snap = snap.replace(sites=sites)
+    return snap
+
+
+def _apply_production(snap, delta):
+    df = snap.df
+    rows = merge_names(delta.upserts, snap.minerals, snap.countries, 'mineral', 'country')
+    cube = snap.production_cube.copy()
+    if df.empty:
+        df = rows
+    else:
+        stale = df['StatID'].isin(list(delta.previous.index))
+        cube.remove_rows(df[stale])
+        df = pd.concat([df[~stale], rows], ignore_index=True)
+    cube.add_rows(rows)
+    return snap.replace(df=df, production_cube=cube)
+
+
+def _apply_sites(snap, delta):
+    sites = snap.sites.copy()
+    for key in delta.previous.index:
+        sites.remove(key)
+    rows = merge_names(delta.upserts, snap.minerals, snap.countries, 'MineralName', 'CountryName')
+    for row in rows.to_dict('records'):
+        sites.add(SiteRecord(**row))
+    return snap.replace(sites=sites)
+
+
+# Polls the source CSVs of every table for (mtime, size) changes.
+# baseline maps table -> fingerprint already applied; poll() reports tables whose files
+# changed since, and mark() records a fingerprint once its change has been applied.
+class CsvWatcher:
+    def __init__(self, data_dir, baseline=None):
+        self.data_dir = data_dir
+        self._seen = {table: csv_fingerprint(data_dir, table) for table in TABLES}
+        self._seen.update(baseline or {})
+        self._lock = threading.Lock()
+
+    def poll(self):
+        with self._lock:
+            changed = {}
+            for table in TABLES:
+                fingerprint = csv_fingerprint(self.data_dir, table)
+                if fingerprint != self._seen.get(table):
+                    changed[table] = fingerprint
+            return changed
+
+    def mark(self, table, fingerprint):
+        with self._lock:
+            self._seen[table] = fingerprint
@@ -0,0 +1,242 @@
+import csv
+import io
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import backends
+from data_loader import merge_names
+from site_index import normalize_coords
+from storage import SQLiteStore
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value != value:  # NaN
+        return ''
+    return value
+
+
+# Export definitions: CSV columns plus the PDF title and per-row line format
+EXPORTS = {
+    'minerals': {
+        'title': 'Mineral Data Export',
+        'columns': ['MineralID', 'MineralName', 'Description', 'MarketPriceUSD_per_tonne'],
+        'line': lambda r: f"{r.get('MineralName')}: {_text(r.get('Description',''))} | ${_text(r.get('MarketPriceUSD_per_tonne',''))}",
+    },
+    'countries': {
+        'title': 'Country Data Export',
+        'columns': ['CountryID', 'CountryName', 'GDP_BillionUSD', 'MiningRevenue_BillionUSD', 'KeyProjects'],
+        'line': lambda r: f"{r.get('CountryName')}: GDP ${_text(r.get('GDP_BillionUSD',''))}B | Mining Revenue ${_text(r.get('MiningRevenue_BillionUSD',''))}B | Projects: {_text(r.get('KeyProjects',''))}",
+    },
+    'sites': {
+        'title': 'Mining Site Export',
+        'columns': ['SiteID', 'SiteName', 'MineralName', 'CountryName', 'Latitude', 'Longitude', 'Production_tonnes'],
+        'line': lambda r: f"{r.get('SiteName')}: {_text(r.get('MineralName'))} in {_text(r.get('CountryName'))} ({_text(r.get('Production_tonnes'))} tonnes) [{_text(r.get('Latitude'))}, {_text(r.get('Longitude'))}]",
+    },
+    'production': {
+        'title': 'Production Statistics Export',
+        'columns': ['StatID', 'Year', 'mineral', 'country', 'Production_tonnes', 'ExportValue_BillionUSD'],
+        'line': lambda r: f"{_text(r.get('Year'))} {_text(r.get('mineral'))} / {_text(r.get('country'))}: {_text(r.get('Production_tonnes'))} tonnes, ${_text(r.get('ExportValue_BillionUSD'))}B",
+    },
+}
+FORMATS = {'csv': 'text/csv', 'pdf': 'application/pdf'}
+
+# <kind>-v<data version>.<fmt>; the version is a store version or <instance token>-<version>
+JOB_ID = re.compile(r'(?P<kind>\w+)-v(?P<version>(?:[0-9a-f]+-)?\d+)\.(?P<fmt>\w+)')
+
+
+def iter_records(frame, columns, chunk_size=5000):
+    # Row dicts of a (possibly huge) frame, export columns only, converted one slice at a time
+    for start in range(0, len(frame), chunk_size):
+        chunk = frame.iloc[start:start + chunk_size].reindex(columns=columns)
+        for values in chunk.itertuples(index=False, name=None):
+            yield dict(zip(columns, values))
+
+
+def store_rows(store_path, kind, version):
+    # Export rows read straight from the shared store, so a pool job only needs the store
+    # path and data version. Names are joined and site coordinates fixed as the app does.
+    store = SQLiteStore(store_path)
+    minerals = store.frame('minerals')
+    countries = store.frame('countries')
+    if kind == 'minerals':
+        frame = minerals
+    elif kind == 'countries':
+        frame = countries
+    else:
+        table, names = ('sites', ('MineralName', 'CountryName')) if kind == 'sites' else ('production_stats', ('mineral', 'country'))
+        frame = merge_names(store.frame(table), minerals.set_index('MineralName').to_dict('index'),
+                            countries.set_index('CountryName').to_dict('index'), *names)
+    if str(store.version()) != str(version):
+        raise RuntimeError(f"data changed while exporting {kind} (wanted version {version})")
+    rows = iter_records(frame, EXPORTS[kind]['columns'])
+    return map(_placed, rows) if kind == 'sites' else rows
+
+
+def _placed(row):
+    coords = normalize_coords(row['Latitude'], row['Longitude'])
+    if coords is not None:
+        row['Latitude'], row['Longitude'] = coords
+    return row
+
+
+def iter_csv(kind, rows, page_size=500):
+    # Yield the CSV one page of rows at a time
+    columns = EXPORTS[kind]['columns']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_text(row.get(c)) for c in columns])
+        if i % page_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_pdf(kind, rows, out):
+    letter = backends.get('reportlab.pagesizes').letter
+    canvas = backends.get('reportlab.canvas')
+    spec = EXPORTS[kind]
+    p = canvas.Canvas(out, pagesize=letter)
+    p.setFont("Helvetica", 12)
+    y = 750
+    p.drawString(30, y, spec['title'])
+    y -= 30
+    for row in rows:
+        p.drawString(30, y, spec['line'](row))
+        y -= 20
+        if y < 50:
+            p.showPage()
+            p.setFont("Helvetica", 12)
+            y = 750
+    p.save()
+
+
+def build_artifact(kind, fmt, rows, path):
+    # Render to a temp file and atomically move it into place; runs in a pool process for jobs
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if fmt == 'pdf':
+            write_pdf(kind, rows, tmp)
+        else:
+            with open(tmp, 'w', newline='', encoding='utf-8') as f:
+                for chunk in iter_csv(kind, rows):
+                    f.write(chunk)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def build_from_store(kind, fmt, store_path, version, path):
+    return build_artifact(kind, fmt, store_rows(store_path, kind, version), path)
+
+
+# Disk cache of finished exports keyed by (kind, data version, format), plus
+# background jobs for large exports: in a process pool reading the shared store, or in a
+# thread over the in-memory rows when there is no store.
+class ExportManager:
+    def __init__(self, cache_dir, max_workers=2, async_rows=20000):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.async_rows = async_rows
+        self._pool = None
+        self._threads = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def job_id(self, kind, fmt, version):
+        return f"{kind}-v{version}.{fmt}"
+
+    def parse_job_id(self, job_id):
+        # (kind, fmt, version) of a well-formed job id, else None
+        match = JOB_ID.fullmatch(job_id)
+        if match is None or match['kind'] not in EXPORTS or match['fmt'] not in FORMATS:
+            return None
+        return match['kind'], match['fmt'], match['version']
+
+    def path(self, job_id):
+        return os.path.join(self.cache_dir, job_id)
+
+    def cached(self, kind, fmt, version):
+        path = self.path(self.job_id(kind, fmt, version))
+        return path if os.path.exists(path) else None
+
+    def prune(self, kind, fmt, version):
+        # Remove artifacts of the same kind/format built for older data versions
+        keep = self.job_id(kind, fmt, version)
+        prefix = f"{kind}-v"
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith(f".{fmt}") and name != keep:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def build(self, kind, fmt, rows, version):
+        path = build_artifact(kind, fmt, rows, self.path(self.job_id(kind, fmt, version)))
+        self.prune(kind, fmt, version)
+        return path
+
+    def stream_csv(self, kind, rows, version):
+        # Stream CSV pages to the client while teeing them into the cache file
+        path = self.path(self.job_id(kind, 'csv', version))
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        f = open(tmp, 'w', newline='', encoding='utf-8')
+        try:
+            for chunk in iter_csv(kind, rows):
+                f.write(chunk)
+                yield chunk
+            f.close()
+            os.replace(tmp, path)
+            self.prune(kind, 'csv', version)
+        finally:
+            if not f.closed:
+                f.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def _thread_pool(self):
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._threads
+
+    def submit(self, kind, fmt, version, store_path=None, rows=None):
+        # rows (a lazy iterable) is only used without a store; it is never pickled
+        job_id = self.job_id(kind, fmt, version)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not (job.done() and job.exception() is not None):
+                return job_id
+            if store_path is not None:
+                future = self._executor().submit(build_from_store, kind, fmt, store_path, version, self.path(job_id))
+            else:
+                future = self._thread_pool().submit(build_artifact, kind, fmt, rows, self.path(job_id))
+            future.add_done_callback(lambda f: f.exception() is None and self.prune(kind, fmt, version))
+            self._jobs[job_id] = future
+        return job_id
+
+    def status(self, job_id):
+        if self.parse_job_id(job_id) is None:
+            return None
+        if os.path.exists(self.path(job_id)):
+            return 'done'
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if not job.done():
+            return 'running'
+        return 'failed' if job.exception() is not None else 'done'
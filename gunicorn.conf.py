@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+
+# Production launcher, replacing the debug server: gunicorn -c gunicorn.conf.py
+# SERVER_MODE=wsgi (default): threaded workers; slow renders are capped per lane inside each worker,
+# and in total below WEB_THREADS.
+# SERVER_MODE=asgi: uvicorn workers running asgi:application (needs the uvicorn package).
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 8)))
+
+if os.environ.get('SERVER_MODE', 'wsgi').lower() == 'asgi':
+    wsgi_app = 'asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app:app'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('WEB_THREADS', 8))
+
+    def post_worker_init(worker):
+        # Keep some of each worker's threads free of renders for logins and dashboards
+        from app import render_pools
+        render_pools.size_for(threads)
+
+# Workers import the app themselves so each one starts its own data watcher and render pools;
+# the columnar snapshot is memory-mapped, so its pages are still shared between them
+preload_app = False
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))  # synchronous PDF exports
+graceful_timeout = 30
+keepalive = 5
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = '-'
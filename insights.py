@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl  # POSIX advisory locks for the JSONL log; absent on Windows
+except ImportError:
+    fcntl = None
+
+PAGE_SIZE = 20
+
+
+def _matches(record, kind, subject, user):
+    return ((kind is None or record['type'] == kind) and (subject is None or record.get('subject') == subject)
+            and (user is None or record['user'] == user))
+
+
+# Newest insights per type kept in memory, so the first page of each listing is served
+# without touching the log. Bounded: older entries fall off and are read from the log.
+class TailCache:
+    def __init__(self, size=200):
+        self.size = size
+        self._tails = {}     # type -> deque of records, newest last
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def add(self, records):
+        with self._lock:
+            for record in records:
+                if record['id'] <= self._last_id:
+                    continue
+                self._tails.setdefault(record['type'], deque(maxlen=self.size)).append(record)
+                self._last_id = record['id']
+
+    def page(self, kind, subject, user, before, limit):
+        # Records newest-first from the tail, or None when the tail may not hold enough of them
+        with self._lock:
+            tail = self._tails.get(kind, ())
+            found = []
+            for record in reversed(tail):
+                if before is not None and record['id'] >= before:
+                    continue
+                if _matches(record, kind, subject, user):
+                    found.append(record)
+                    if len(found) > limit:
+                        return found
+            # Fewer matches than asked for: only trustworthy if the tail has never overflowed
+            return found if len(tail) < self.size else None
+
+
+# Append-only insights log in the shared SQLite store. Rows are never updated; ids are
+# monotonically increasing and double as pagination cursors ("older than id N").
+class SQLiteInsightLog:
+    def __init__(self, store, tail_size=200):
+        self.store = store
+        self.tail = TailCache(tail_size)
+        conn = store.connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS insights (id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, "
+                     "subject TEXT, user TEXT NOT NULL, insight TEXT NOT NULL, created_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_insights_type ON insights (type, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_insights_subject ON insights (type, subject, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_insights_user ON insights (user, id)")
+        conn.commit()
+        self._load_tail()
+
+    def _rows(self, sql, params):
+        cur = self.store.connection().execute(sql, params)
+        columns = [d[0] for d in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    def _load_tail(self):
+        # Newest tail_size rows per type at startup, then only rows appended since (by any worker)
+        if self.tail.last_id == 0:
+            rows = self._rows("SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY type ORDER BY id DESC) AS n "
+                              "FROM insights) WHERE n <= ? ORDER BY id", (self.tail.size,))
+            for row in rows:
+                row.pop('n')
+        else:
+            rows = self._rows("SELECT * FROM insights WHERE id > ? ORDER BY id", (self.tail.last_id,))
+        self.tail.add(rows)
+
+    def append(self, kind, user, insight, subject=None):
+        conn = self.store.connection()
+        record = {'type': kind, 'subject': subject, 'user': user, 'insight': insight, 'created_at': time.time()}
+        with conn:
+            record['id'] = conn.execute("INSERT INTO insights (type, subject, user, insight, created_at) VALUES (?, ?, ?, ?, ?)",
+                                        (kind, subject, user, insight, record['created_at'])).lastrowid
+        self._load_tail()
+        return record
+
+    def page(self, kind, subject=None, user=None, before=None, limit=PAGE_SIZE):
+        # (records newest-first, cursor for the next page or None)
+        self._load_tail()
+        found = self.tail.page(kind, subject, user, before, limit)
+        if found is None:
+            where, params = ["type = ?"], [kind]
+            for column, value in (('subject', subject), ('user', user), ('id <', before)):
+                if value is not None:
+                    where.append(f"{column} ?" if column.endswith('<') else f"{column} = ?")
+                    params.append(value)
+            found = self._rows(f"SELECT * FROM insights WHERE {' AND '.join(where)} ORDER BY id DESC LIMIT ?", params + [limit + 1])
+        return found[:limit], (found[limit - 1]['id'] if len(found) > limit else None)
+
+
+# Append-only JSON-lines log for deployments without the SQLite store. Each worker keeps
+# in-memory indexes (ids by type, subject and user, and each id's position in the file) and
+# tails the file for lines appended by other workers; records themselves stay on disk and are
+# read on demand, apart from the bounded tail. Appends take an exclusive lock so ids stay
+# unique across processes. The indexes still grow with the log (tens of bytes per insight),
+# so large deployments should use the SQLite store.
+class JsonlInsightLog:
+    def __init__(self, path, tail_size=200):
+        self.path = path
+        self.tail = TailCache(tail_size)
+        self._offsets = {}    # id -> (byte offset, length) of its line
+        self._by_type = {}    # type -> [ids], ascending
+        self._by_subject = {} # (type, subject) -> [ids]
+        self._by_user = {}    # user -> [ids]
+        self._offset = 0
+        self._last_id = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            self._catch_up()
+
+    def _index(self, record, offset, length):
+        rid = record['id']
+        self._offsets[rid] = (offset, length)
+        self._by_type.setdefault(record['type'], []).append(rid)
+        if record.get('subject') is not None:
+            self._by_subject.setdefault((record['type'], record['subject']), []).append(rid)
+        self._by_user.setdefault(record['user'], []).append(rid)
+        self._last_id = max(self._last_id, rid)
+
+    def _catch_up(self):
+        # Read lines appended since the last read (by this or another worker)
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b'\n') + 1  # ignore a partially written last line
+        new = []
+        position = 0
+        while position < end:
+            stop = data.index(b'\n', position) + 1
+            line = data[position:stop]
+            if line.strip():
+                record = json.loads(line)
+                self._index(record, self._offset + position, len(line))
+                new.append(record)
+            position = stop
+        self.tail.add(new)
+        self._offset += end
+
+    def _read(self, f, rid):
+        offset, length = self._offsets[rid]
+        f.seek(offset)
+        return json.loads(f.read(length))
+
+    def append(self, kind, user, insight, subject=None):
+        with self._lock, open(self.path, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._catch_up()
+                record = {'id': self._last_id + 1, 'type': kind, 'subject': subject, 'user': user,
+                          'insight': insight, 'created_at': time.time()}
+                f.write(json.dumps(record).encode() + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+                self._catch_up()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return record
+
+    def page(self, kind, subject=None, user=None, before=None, limit=PAGE_SIZE):
+        with self._lock:
+            self._catch_up()
+            found = self.tail.page(kind, subject, user, before, limit)
+            if found is None:
+                # Walk the narrowest index backwards from the cursor
+                if subject is not None:
+                    ids = self._by_subject.get((kind, subject), [])
+                elif user is not None:
+                    ids = self._by_user.get(user, [])
+                else:
+                    ids = self._by_type.get(kind, [])
+                found = []
+                with open(self.path, 'rb') as f:
+                    for rid in reversed(ids):
+                        if before is not None and rid >= before:
+                            continue
+                        record = self._read(f, rid)
+                        if _matches(record, kind, subject, user):
+                            found.append(record)
+                            if len(found) > limit:
+                                break
+        return found[:limit], (found[limit - 1]['id'] if len(found) > limit else None)
+
+
+def open_insight_log(store=None, path='data/insights.jsonl', tail_size=200):
+    # The shared store when there is one, else the JSONL file
+    if store is not None:
+        return SQLiteInsightLog(store, tail_size)
+    return JsonlInsightLog(path, tail_size)
@@ -0,0 +1,238 @@
+import bisect
+import cProfile
+import os
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+
+# Latency buckets in seconds (Prometheus 'le' bounds; +Inf is implicit)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ALLOC_BUCKETS = (16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{name}_bucket{_labels(labels, le=le)} {cumulative}'
+        yield f'{name}_sum{_labels(labels)} {self.sum}'
+        yield f'{name}_count{_labels(labels)} {cumulative}'
+
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+@contextmanager
+def phase(name):
+    # Time a block of request work ('filter', 'figure', 'template', 'serialize', ...)
+    if not has_request_context() or not hasattr(g, 'phases'):
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.phases[name] = g.phases.get(name, 0.0) + time.perf_counter() - started
+
+
+def _rss_bytes():
+    # Current resident set size (Linux /proc), falling back to the peak from getrusage
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Request instrumentation: per-route latency histograms, per-phase time split, cache hit
+# rates, optional per-request allocation tracking and sampled cProfile dumps, exposed in
+# Prometheus text format. Hooks are registered on the app; views add phases with phase().
+# tracemalloc is process-wide, so a request's allocation figure is only recorded when no
+# other request overlapped it; background threads (data watcher, warm-up) still count.
+class Instrumentation:
+    def __init__(self, app=None, profile_dir='data/profiles', profile_sample_rate=0.0,
+                 trace_allocations=False, can_profile=lambda: True):
+        self.profile_dir = profile_dir
+        self.profile_sample_rate = profile_sample_rate
+        self.trace_allocations = trace_allocations
+        self.can_profile = can_profile
+        self._latency = {}     # route -> Histogram
+        self._phases = {}      # (route, phase) -> Histogram
+        self._allocs = {}      # route -> Histogram
+        self._requests = {}    # (route, method, status) -> count
+        self._caches = {}      # name -> object with stats()
+        self._gauges = {}      # name -> (help, fn)
+        self._counters = {}    # name -> (help, label, fn returning {label value: count})
+        self._active = 0       # requests in flight (allocation tracing)
+        self._started = 0      # requests started so far (allocation tracing)
+        self._alloc_skipped = 0
+        self._profile_lock = threading.Lock()  # cProfile allows one active profiler per process
+        self._lock = threading.Lock()
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_done, app)
+
+    def register_cache(self, name, cache):
+        self._caches[name] = cache
+
+    def gauge(self, name, help_text, fn):
+        self._gauges[name] = (help_text, fn)
+
+    def counter(self, name, help_text, label, fn):
+        self._counters[name] = (help_text, label, fn)
+
+    # --- request hooks ----------------------------------------------------
+
+    def _wants_profile(self):
+        if request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1':
+            return self.can_profile()
+        return self.profile_sample_rate > 0 and random.random() < self.profile_sample_rate
+
+    def _before(self):
+        g.phases = {}
+        g.request_started = time.perf_counter()
+        g.profiler = None
+        if self.trace_allocations:
+            with self._lock:
+                self._active += 1
+                self._started += 1
+                # Another request in flight shares (and would reset) the process-wide peak
+                g.alloc_solo = self._active == 1
+                g.alloc_started = self._started
+                if g.alloc_solo:
+                    tracemalloc.reset_peak()
+            g.alloc_start = tracemalloc.get_traced_memory()[0]
+        if self._wants_profile() and self._profile_lock.acquire(blocking=False):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def _after(self, response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._profile_lock.release()
+            response.headers['X-Profile-Dump'] = self._dump(profiler, request.endpoint or 'unmatched')
+        allocated = None
+        if self.trace_allocations and 'alloc_start' in g:
+            peak = tracemalloc.get_traced_memory()[1]
+            with self._lock:
+                self._active -= 1
+                if g.alloc_solo and self._started == g.alloc_started:
+                    allocated = max(0, peak - g.alloc_start)
+                else:
+                    self._alloc_skipped += 1
+            g.pop('alloc_start')
+        with self._lock:
+            self._latency.setdefault(route, Histogram()).observe(elapsed)
+            for name, seconds in g.phases.items():
+                self._phases.setdefault((route, name), Histogram()).observe(seconds)
+            if allocated is not None:
+                self._allocs.setdefault(route, Histogram(ALLOC_BUCKETS)).observe(allocated)
+            key = (route, request.method, str(response.status_code))
+            self._requests[key] = self._requests.get(key, 0) + 1
+        response.headers['Server-Timing'] = ', '.join(
+            [f'{name};dur={seconds * 1000:.1f}' for name, seconds in g.phases.items()] + [f'total;dur={elapsed * 1000:.1f}'])
+        return response
+
+    def _teardown(self, exc):
+        # A request that failed before after_request still has to stop its profiler
+        if g.pop('alloc_start', None) is not None:
+            with self._lock:
+                self._active -= 1
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._profile_lock.release()
+
+    def _template_started(self, sender, template, context, **extra):
+        if hasattr(g, 'phases'):
+            g.template_started = time.perf_counter()
+
+    def _template_done(self, sender, template, context, **extra):
+        started = g.pop('template_started', None)
+        if started is not None:
+            g.phases['template'] = g.phases.get('template', 0.0) + time.perf_counter() - started
+
+    def _dump(self, profiler, endpoint):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{random.randrange(1 << 16):04x}.prof")
+        profiler.dump_stats(path)
+        return os.path.basename(path)
+
+    # --- exposition -------------------------------------------------------
+
+    def render(self):
+        # Prometheus text exposition format (version 0.0.4)
+        out = []
+        with self._lock:
+            out += ['# HELP app_request_duration_seconds Request latency by route.',
+                    '# TYPE app_request_duration_seconds histogram']
+            for route, hist in sorted(self._latency.items()):
+                out += hist.lines('app_request_duration_seconds', {'route': route})
+            out += ['# HELP app_request_phase_seconds Time spent per request phase (filter, figure, template, serialize, ...).',
+                    '# TYPE app_request_phase_seconds histogram']
+            for (route, name), hist in sorted(self._phases.items()):
+                out += hist.lines('app_request_phase_seconds', {'route': route, 'phase': name})
+            if self.trace_allocations:
+                out += ['# HELP app_request_allocated_bytes Peak Python memory allocated while handling a request.',
+                        '# TYPE app_request_allocated_bytes histogram']
+                for route, hist in sorted(self._allocs.items()):
+                    out += hist.lines('app_request_allocated_bytes', {'route': route})
+                out += ['# HELP app_request_allocations_skipped_total Requests not measured because another request overlapped them.',
+                        '# TYPE app_request_allocations_skipped_total counter',
+                        f'app_request_allocations_skipped_total {self._alloc_skipped}']
+            out += ['# HELP app_requests_total Requests by route, method and status.',
+                    '# TYPE app_requests_total counter']
+            for (route, method, status), count in sorted(self._requests.items()):
+                out.append(f'app_requests_total{_labels({"route": route, "method": method, "status": status})} {count}')
+        out += ['# HELP app_cache_hits_total Cache hits.', '# TYPE app_cache_hits_total counter']
+        stats = {name: cache.stats() for name, cache in sorted(self._caches.items())}
+        out += [f'app_cache_hits_total{_labels({"cache": n})} {s["hits"]}' for n, s in stats.items()]
+        out += ['# HELP app_cache_misses_total Cache misses.', '# TYPE app_cache_misses_total counter']
+        out += [f'app_cache_misses_total{_labels({"cache": n})} {s["misses"]}' for n, s in stats.items()]
+        out += ['# HELP app_cache_hit_ratio Cache hits / lookups.', '# TYPE app_cache_hit_ratio gauge']
+        out += [f'app_cache_hit_ratio{_labels({"cache": n})} {s["hit_rate"]}' for n, s in stats.items()]
+        out += ['# HELP app_cache_entries Entries currently cached.', '# TYPE app_cache_entries gauge']
+        out += [f'app_cache_entries{_labels({"cache": n})} {s["size"]}' for n, s in stats.items()]
+        out += ['# HELP app_process_resident_memory_bytes Resident memory of this worker.',
+                '# TYPE app_process_resident_memory_bytes gauge', f'app_process_resident_memory_bytes {_rss_bytes()}']
+        for name, (help_text, fn) in sorted(self._gauges.items()):
+            out += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {fn()}']
+        for name, (help_text, label, fn) in sorted(self._counters.items()):
+            out += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            out += [f'{name}{_labels({label: value})} {count}' for value, count in sorted(fn().items())]
+        return '\n'.join(out) + '\n'
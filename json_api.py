@@ -0,0 +1,81 @@
+import gzip
+import json
+import math
+import threading
+import zlib
+import numpy as np
+
+try:
+    import brotli  # optional: enables Content-Encoding: br
+except ImportError:
+    brotli = None
+
+
+def plain(value):
+    # NumPy/pandas values -> JSON-safe Python values (NaN -> null)
+    if isinstance(value, dict):
+        return {str(k): plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return plain(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+# One serialized API payload. The strong ETag combines the data version with a digest
+# of the body, suffixed per content coding (each encoding is a different representation);
+# compressed variants are produced on first use and kept with the entry.
+class CachedResponse:
+    def __init__(self, payload, version, serialized=False):
+        # serialized=True: payload is already a JSON string/bytes (e.g. from plotly's to_json)
+        if serialized:
+            self.body = payload.encode() if isinstance(payload, str) else payload
+        else:
+            self.body = json.dumps(plain(payload), separators=(',', ':')).encode()
+        self.tag = f'{version}-{zlib.crc32(self.body):08x}'
+        self._encoded = {'identity': self.body}
+        self._lock = threading.Lock()
+
+    def etag(self, encoding='identity'):
+        # Unquoted entity tag of one encoding's representation
+        return self.tag if encoding == 'identity' else f'{self.tag}-{encoding}'
+
+    def matches(self, if_none_match):
+        # A client holding any encoding of this body has current data
+        return any(if_none_match.contains(self.etag(encoding)) for encoding in ('identity', 'gzip', 'br'))
+
+    def encoded(self, encoding):
+        with self._lock:
+            data = self._encoded.get(encoding)
+            if data is None:
+                if encoding == 'br':
+                    data = brotli.compress(self.body, quality=5)
+                else:
+                    data = gzip.compress(self.body, compresslevel=6, mtime=0)
+                self._encoded[encoding] = data
+            return data
+
+
+def negotiate(accept_encoding, min_size=512, size=0):
+    # Pick br > gzip > identity from an Accept-Encoding header (small bodies are sent as-is)
+    if size < min_size:
+        return 'identity'
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', accepted.get('*', 0)) > 0:
+        return 'gzip'
+    return 'identity'
@@ -0,0 +1,81 @@
+import zlib
+
+# helper mapping of keywords to permission flags
+keyword_map = {
+    'profile': 'profiles',
+    'profiles': 'profiles',
+    'chart': 'charts',
+    'charts': 'charts',
+    'export': 'export',
+    'exports': 'export',
+    'production': 'production',
+    'mineral': 'database',
+    'database': 'database',
+    'insight': 'insights',
+    'insights': 'insights',
+    'map': 'map',
+    'all': 'all',
+    'admin': 'all',
+    'administrator': 'all'
+}
+
+# One bit per permission flag
+FLAGS = ('all', 'database', 'profiles', 'charts', 'map', 'export', 'insights', 'production')
+BITS = {flag: 1 << i for i, flag in enumerate(FLAGS)}
+ALL = BITS['all']
+
+
+def mask_for(*flags):
+    mask = 0
+    for flag in flags:
+        mask |= BITS[flag]
+    return mask
+
+
+def allows(mask, required):
+    # 'all' grants everything; otherwise every required bit must be present
+    return bool(mask & ALL) or (mask & required) == required
+
+
+def parse_permissions(perms_str):
+    perms_str = str(perms_str).lower()
+    flags = set()
+    # If the permission cell contains 'full' or 'all', grant all
+    if 'full' in perms_str or 'all access' in perms_str or 'full access' in perms_str:
+        flags.add('all')
+    else:
+        # search for keywords
+        for kw, flag in keyword_map.items():
+            if kw in perms_str:
+                flags.add(flag)
+    return flags
+
+
+# roles.csv compiled once into bitmasks and a RoleID -> role name map.
+# version is a digest of the compiled masks (identical in every worker), so sessions
+# holding a mask from an older roles table recompute it.
+class RoleTable:
+    def __init__(self, rows=()):
+        self.masks = {}        # role name -> int mask
+        self.names = {}        # RoleID -> role name
+        self.permissions = {}  # role name -> sorted flag list (templates use this)
+        for role_id, role_name, perms in rows:
+            flags = parse_permissions(perms)
+            # Ensure Researchers can view the map and export by default (policy override)
+            if role_name == 'Researcher':
+                flags.update(('map', 'export'))
+            self.masks[role_name] = mask_for(*flags)
+            self.names[role_id] = role_name
+            self.permissions[role_name] = sorted(flags)
+        self.version = zlib.crc32(repr(sorted(self.masks.items())).encode())
+
+    @classmethod
+    def from_frame(cls, roles_df):
+        rows = [(row['RoleID'], row['RoleName'], row.get('Permissions', '')) for _, row in roles_df.iterrows()]
+        return cls(rows)
+
+    def mask(self, role_name):
+        return self.masks.get(role_name, 0)
+
+    def role_name(self, role_id, default='Unknown'):
+        return self.names.get(role_id, default)
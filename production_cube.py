@@ -0,0 +1,236 @@
+import threading
+import numpy as np
+import pandas as pd
+
+
+MEASURES = ('Production_tonnes', 'ExportValue_BillionUSD')
+
+
+# Pre-aggregated production stats indexed by (year, MineralID, CountryID).
+# Built once from the merged production frame; every filter combination used by
+# the charts is answered by slicing these arrays instead of copying/grouping the frame.
+class ProductionCube:
+    def __init__(self):
+        self.years = np.empty(0, dtype=np.int64)   # sorted
+        self.mineral_ids = []                       # insertion order
+        self.country_ids = []
+        self.mineral_names = []
+        self.country_names = []
+        self._mineral_pos = {}
+        self._country_pos = {}
+        self._mineral_by_name = {}
+        self._country_by_name = {}
+        # cells[measure] has shape (years, minerals, countries); counts tracks which cells hold rows
+        self.cells = {m: np.zeros((0, 0, 0)) for m in MEASURES}
+        self.counts = np.zeros((0, 0, 0), dtype=np.int64)
+        # Rollups along each axis, kept in sync with the cells
+        self.by_year_mineral = {m: np.zeros((0, 0)) for m in MEASURES}
+        self.by_year_country = {m: np.zeros((0, 0)) for m in MEASURES}
+        self.by_year = {m: np.zeros(0) for m in MEASURES}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, frame):
+        cube = cls()
+        cube.add_rows(frame)
+        return cube
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def copy(self):
+        # Independent copy so a new data snapshot can be updated without touching readers of the old one
+        cube = ProductionCube()
+        cube.years = self.years.copy()
+        cube.mineral_ids = list(self.mineral_ids)
+        cube.country_ids = list(self.country_ids)
+        cube.mineral_names = list(self.mineral_names)
+        cube.country_names = list(self.country_names)
+        cube._mineral_pos = dict(self._mineral_pos)
+        cube._country_pos = dict(self._country_pos)
+        cube._mineral_by_name = dict(self._mineral_by_name)
+        cube._country_by_name = dict(self._country_by_name)
+        cube.cells = {m: a.copy() for m, a in self.cells.items()}
+        cube.counts = self.counts.copy()
+        cube.by_year_mineral = {m: a.copy() for m, a in self.by_year_mineral.items()}
+        cube.by_year_country = {m: a.copy() for m, a in self.by_year_country.items()}
+        cube.by_year = {m: a.copy() for m, a in self.by_year.items()}
+        return cube
+
+    @property
+    def empty(self):
+        return not self.counts.any()
+
+    # --- axis maintenance -------------------------------------------------
+
+    def _grow(self, axis, count, position=None):
+        # Insert `count` zero slots along `axis` (appended unless a position is given)
+        def grow(arr, ax):
+            if position is None:
+                pad = [(0, 0)] * arr.ndim
+                pad[ax] = (0, count)
+                return np.pad(arr, pad)
+            return np.insert(arr, [position] * count, 0, axis=ax)
+        self.counts = grow(self.counts, axis)
+        for m in MEASURES:
+            self.cells[m] = grow(self.cells[m], axis)
+            if axis == 0:
+                self.by_year_mineral[m] = grow(self.by_year_mineral[m], 0)
+                self.by_year_country[m] = grow(self.by_year_country[m], 0)
+                self.by_year[m] = grow(self.by_year[m], 0)
+            elif axis == 1:
+                self.by_year_mineral[m] = grow(self.by_year_mineral[m], 1)
+            else:
+                self.by_year_country[m] = grow(self.by_year_country[m], 1)
+
+    def _ensure_years(self, years):
+        for year in sorted(set(years) - set(self.years.tolist())):
+            pos = int(np.searchsorted(self.years, year))
+            self.years = np.insert(self.years, pos, year)
+            self._grow(0, 1, position=pos)
+
+    def _ensure_labels(self, ids, names, id_list, name_list, pos_map, name_map, axis):
+        new = 0
+        for key, name in zip(ids, names):
+            if key in pos_map:
+                continue
+            label = name if isinstance(name, str) and name else str(key)
+            pos_map[key] = len(id_list)
+            id_list.append(key)
+            name_list.append(label)
+            name_map.setdefault(label, pos_map[key])
+            new += 1
+        if new:
+            self._grow(axis, new)
+
+    # --- incremental updates ----------------------------------------------
+
+    def add_rows(self, frame):
+        # Accumulate rows (Year, MineralID, CountryID, measures[, mineral, country]) into the cube
+        self._accumulate(frame, 1)
+
+    def remove_rows(self, frame):
+        # Subtract rows previously added (e.g. rows deleted or changed by a data reload)
+        self._accumulate(frame, -1)
+
+    def _accumulate(self, frame, sign):
+        if frame is None or len(frame) == 0:
+            return
+        frame = frame.dropna(subset=['Year', 'MineralID', 'CountryID'])
+        if frame.empty:
+            return
+        years = frame['Year'].astype(np.int64).to_numpy()
+        mids = frame['MineralID'].astype(np.int64).to_numpy()
+        cids = frame['CountryID'].astype(np.int64).to_numpy()
+        mnames = frame['mineral'].to_numpy() if 'mineral' in frame.columns else [None] * len(frame)
+        cnames = frame['country'].to_numpy() if 'country' in frame.columns else [None] * len(frame)
+        with self._lock:
+            self._ensure_years(np.unique(years).tolist())
+            self._ensure_labels(mids.tolist(), mnames, self.mineral_ids, self.mineral_names,
+                                self._mineral_pos, self._mineral_by_name, 1)
+            self._ensure_labels(cids.tolist(), cnames, self.country_ids, self.country_names,
+                                self._country_pos, self._country_by_name, 2)
+            yi = np.searchsorted(self.years, years)
+            mi = np.fromiter((self._mineral_pos[k] for k in mids.tolist()), dtype=np.int64, count=len(mids))
+            ci = np.fromiter((self._country_pos[k] for k in cids.tolist()), dtype=np.int64, count=len(cids))
+            np.add.at(self.counts, (yi, mi, ci), sign)
+            for m in MEASURES:
+                values = pd.to_numeric(frame[m], errors='coerce').fillna(0).to_numpy(dtype=np.float64) if m in frame.columns else np.zeros(len(frame))
+                values = values * sign
+                np.add.at(self.cells[m], (yi, mi, ci), values)
+                np.add.at(self.by_year_mineral[m], (yi, mi), values)
+                np.add.at(self.by_year_country[m], (yi, ci), values)
+                np.add.at(self.by_year[m], yi, values)
+
+    # --- queries ----------------------------------------------------------
+
+    def mineral_position(self, name):
+        return self._mineral_by_name.get(name)
+
+    def country_position(self, name):
+        return self._country_by_name.get(name)
+
+    def resolve(self, mineral_name=None, country_name=None):
+        # Map filter names to axis positions; returns None for an unknown (non-'all') name
+        mi = ci = None
+        if mineral_name not in (None, 'all'):
+            mi = self.mineral_position(mineral_name)
+            if mi is None:
+                return None
+        if country_name not in (None, 'all'):
+            ci = self.country_position(country_name)
+            if ci is None:
+                return None
+        return mi, ci
+
+    def has_rows(self, mi=None, ci=None):
+        counts = self.counts
+        if mi is not None:
+            counts = counts[:, mi:mi + 1, :]
+        if ci is not None:
+            counts = counts[:, :, ci:ci + 1]
+        return bool(counts.any())
+
+    def yearly(self, mi=None, ci=None):
+        # Totals per year for the given filter, answered from the matching rollup
+        out = {}
+        for m in MEASURES:
+            if mi is None and ci is None:
+                out[m] = self.by_year[m]
+            elif ci is None:
+                out[m] = self.by_year_mineral[m][:, mi]
+            elif mi is None:
+                out[m] = self.by_year_country[m][:, ci]
+            else:
+                out[m] = self.cells[m][:, mi, ci]
+        if mi is None and ci is None:
+            present = self.counts.any(axis=(1, 2))
+        elif ci is None:
+            present = self.counts[:, mi, :].any(axis=1)
+        elif mi is None:
+            present = self.counts[:, :, ci].any(axis=1)
+        else:
+            present = self.counts[:, mi, ci] > 0
+        return self.years[present], {m: v[present] for m, v in out.items()}
+
+    def share_by_mineral(self, mi=None, ci=None, measure='Production_tonnes'):
+        if ci is None:
+            totals = self.by_year_mineral[measure].sum(axis=0)
+            present = self.counts.any(axis=(0, 2))
+        else:
+            totals = self.cells[measure][:, :, ci].sum(axis=0)
+            present = self.counts[:, :, ci].any(axis=0)
+        if mi is not None:
+            present = present & (np.arange(len(present)) == mi)
+        return [self.mineral_names[i] for i in np.flatnonzero(present)], totals[present]
+
+    def share_by_country(self, mi=None, ci=None, measure='Production_tonnes'):
+        if mi is None:
+            totals = self.by_year_country[measure].sum(axis=0)
+            present = self.counts.any(axis=(0, 1))
+        else:
+            totals = self.cells[measure][:, mi, :].sum(axis=0)
+            present = self.counts[:, mi, :].any(axis=0)
+        if ci is not None:
+            present = present & (np.arange(len(present)) == ci)
+        return [self.country_names[i] for i in np.flatnonzero(present)], totals[present]
+
+    def frame(self, mi=None, ci=None):
+        # Long-form frame of populated (year, mineral, country) cells for plotting
+        msel = slice(None) if mi is None else slice(mi, mi + 1)
+        csel = slice(None) if ci is None else slice(ci, ci + 1)
+        yi, mj, cj = np.nonzero(self.counts[:, msel, csel])
+        if mi is not None:
+            mj = mj + mi
+        if ci is not None:
+            cj = cj + ci
+        data = {
+            'Year': self.years[yi],
+            'MineralID': np.asarray(self.mineral_ids, dtype=np.int64)[mj] if len(mj) else np.empty(0, dtype=np.int64),
+            'CountryID': np.asarray(self.country_ids, dtype=np.int64)[cj] if len(cj) else np.empty(0, dtype=np.int64),
+        }
+        for m in MEASURES:
+            data[m] = self.cells[m][yi, mj, cj]
+        data['mineral'] = np.asarray(self.mineral_names, dtype=object)[mj] if len(mj) else np.empty(0, dtype=object)
+        data['country'] = np.asarray(self.country_names, dtype=object)[cj] if len(cj) else np.empty(0, dtype=object)
+        return pd.DataFrame(data)
@@ -0,0 +1,214 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+
+class LaneFull(Exception):
+    def __init__(self, lane):
+        super().__init__(lane)
+        self.lane = lane
+
+
+# A bounded lane for one kind of slow render (plotly charts, folium maps, PDF exports).
+# At most `workers` renders run at once; a render arriving while they are all busy is turned
+# away at once with a 503 rather than parking a request thread until a slot frees up.
+class RenderLane:
+    def __init__(self, name, workers=2):
+        self.name = name
+        self.workers = workers
+        self._running = threading.BoundedSemaphore(workers)
+        self.rejected = 0
+
+    def run(self, fn, *args, **kwargs):
+        # Run fn in the calling thread if a render slot is free
+        if not self._running.acquire(blocking=False):
+            self.rejected += 1
+            raise LaneFull(self.name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._running.release()
+
+
+def parse_lanes(spec):
+    # "charts=2,maps=2,exports=1" -> {name: RenderLane}; "none" disables the caps
+    lanes = {}
+    if (spec or '').strip().lower() == 'none':
+        return lanes
+    for part in (spec or '').split(','):
+        name, _, workers = part.strip().partition('=')
+        if name:
+            lanes[name] = RenderLane(name, max(1, int(workers or 1)))
+    return lanes
+
+
+# Per-renderer concurrency caps for a Flask app. Only the render itself takes a lane slot
+# (pools.run('charts', render_fn, ...) on a cache miss), so cached responses are never
+# turned away; a full lane raises LaneFull, which register(app) turns into a 503.
+# size_for(threads) also caps renders across all lanes so that some of the server's request
+# threads are always left for logins, dashboards and cached responses.
+class RenderPools:
+    def __init__(self, lanes, metrics=None):
+        self.lanes = lanes
+        self.endpoints = set()  # views that may render (see offload)
+        self._budget = None
+        self._local = threading.local()  # lanes the current thread already holds a slot in
+        if metrics is not None:
+            metrics.counter('app_render_rejected_total', 'Requests turned away by a render lane.', 'lane',
+                            lambda: {name: lane.rejected for name, lane in self.lanes.items()})
+
+    def size_for(self, threads, reserve=None):
+        # Admit at most threads - reserve renders at once (reserve defaults to a quarter, min 2)
+        reserve = max(2, threads // 4) if reserve is None else reserve
+        self._budget = threading.BoundedSemaphore(max(1, threads - reserve))
+
+    def offload(self, view):
+        # Mark a view that may render; the ASGI adapter runs it on its thread pool
+        self.endpoints.add(view.__name__)
+        return view
+
+    def run(self, name, fn, *args, **kwargs):
+        lane = self.lanes.get(name)
+        held = getattr(self._local, 'held', None)
+        if held is None:
+            held = self._local.held = set()
+        if lane is None or name in held:
+            # No cap configured, or a nested render reusing this thread's slot
+            return fn(*args, **kwargs)
+        budget = self._budget
+        if budget is not None and not budget.acquire(blocking=False):
+            lane.rejected += 1
+            raise LaneFull(name)
+        held.add(name)
+        try:
+            return lane.run(fn, *args, **kwargs)
+        finally:
+            held.discard(name)
+            if budget is not None:
+                budget.release()
+
+    def register(self, app):
+        app.register_error_handler(LaneFull, lambda e: busy(e.lane))
+
+
+def busy(name):
+    if request.accept_mimetypes.best == 'application/json' or request.path.startswith('/api/'):
+        response = jsonify({'error': f'{name} renderer busy, retry shortly'})
+    else:
+        response = current_app.response_class(f'The {name} renderer is busy; please retry shortly.', mimetype='text/plain')
+    response.status_code = 503
+    response.headers['Retry-After'] = '2'
+    return response
+
+
+# Minimal ASGI adapter for the WSGI app. Lightweight routes (login, dashboard, the JSON API)
+# run right on the event loop; views marked with RenderPools.offload run on a bounded thread
+# pool instead, with their body sent chunk by chunk as the app yields it. Renders within
+# those views are capped by the render lanes, so they never hold every pool thread.
+class AsgiApp:
+    def __init__(self, flask_app, threads=32, offload=()):
+        self.flask_app = flask_app
+        self.offload = offload
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi')
+        self._urls = flask_app.url_map.bind('localhost')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        environ = self.environ(scope, bytes(body))
+        if self.offloaded(scope):
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self.call, environ, loop, send)
+            return
+        # Light route: handled inline and sent in one piece
+        start, result = self.start(environ)
+        try:
+            body = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        await send(start)
+        await send({'type': 'http.response.body', 'body': body})
+
+    def offloaded(self, scope):
+        try:
+            endpoint, _ = self._urls.match(scope['path'], scope['method'])
+        except HTTPException:
+            return False
+        return endpoint in self.offload
+
+    def start(self, environ):
+        # Run the WSGI app; returns the http.response.start message and the body iterable
+        started = {}
+        def start_response(status, headers, exc_info=None):
+            started['status'], started['headers'] = int(status.split(' ', 1)[0]), headers
+        result = self.flask_app(environ, start_response)
+        return {'type': 'http.response.start', 'status': started['status'],
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in started['headers']]}, result
+
+    def call(self, environ, loop, send):
+        # Run the WSGI app on this pool thread and hand each body chunk to the event loop as it
+        # is produced (streamed CSV exports are built while being iterated, so that stays here)
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+        start, result = self.start(environ)
+        try:
+            emit(start)
+            for chunk in result:
+                if chunk:
+                    emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            emit({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    @staticmethod
+    def environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            'CONTENT_LENGTH': str(len(body)),
+        }
+        for name, value in scope.get('headers', []):
+            name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif name != 'CONTENT_LENGTH':
+                key = f'HTTP_{name}'
+                environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
@@ -0,0 +1,113 @@
+import math
+import re
+import threading
+from collections import defaultdict
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text):
+    if not isinstance(text, str):
+        return []
+    return _TOKEN_RE.findall(text.lower())
+
+
+# Tokenized inverted index with prefix lookup for the mineral/country search boxes.
+# fields maps field name -> weight, e.g. {'MineralName': 3.0, 'Description': 1.0}.
+class SearchIndex:
+    PREFIX_MATCH_WEIGHT = 0.5
+
+    def __init__(self, fields):
+        self.fields = dict(fields)
+        self._postings = defaultdict(dict)   # token -> {key: weight}
+        self._prefixes = defaultdict(set)    # prefix -> tokens starting with it
+        self._docs = {}                      # key -> {token: weight}
+        self._order = {}                     # key -> insertion position (stable tie-break)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def copy(self):
+        index = SearchIndex(self.fields)
+        with self._lock:
+            index._postings.update({t: dict(p) for t, p in self._postings.items()})
+            index._prefixes.update({p: set(t) for p, t in self._prefixes.items()})
+            index._docs = dict(self._docs)
+            index._order = dict(self._order)
+        return index
+
+    def add(self, key, record):
+        # Index (or re-index) one record; record is a dict holding the indexed fields
+        weights = defaultdict(float)
+        for field, weight in self.fields.items():
+            for token in tokenize(record.get(field)):
+                weights[token] += weight
+        with self._lock:
+            self._remove(key)
+            self._docs[key] = dict(weights)
+            self._order.setdefault(key, len(self._order))
+            for token, weight in weights.items():
+                postings = self._postings[token]
+                if not postings:
+                    for i in range(1, len(token) + 1):
+                        self._prefixes[token[:i]].add(token)
+                postings[key] = weight
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+            self._order.pop(key, None)
+
+    def _remove(self, key):
+        weights = self._docs.pop(key, None)
+        if not weights:
+            return
+        for token in weights:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[token]
+                for i in range(1, len(token) + 1):
+                    tokens = self._prefixes.get(token[:i])
+                    if tokens is not None:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self._prefixes[token[:i]]
+
+    def _term_scores(self, term):
+        # Score every record matching one query term (exact tokens beat prefix matches)
+        scores = {}
+        n = max(1, len(self._docs))
+        for token in self._prefixes.get(term, ()):
+            postings = self._postings[token]
+            idf = math.log(1 + n / len(postings))
+            factor = 1.0 if token == term else self.PREFIX_MATCH_WEIGHT
+            for key, weight in postings.items():
+                score = weight * idf * factor
+                if score > scores.get(key, 0.0):
+                    scores[key] = score
+        return scores
+
+    def search(self, query, page=1, per_page=20):
+        # Ranked AND search over all query terms; returns (keys for the page, total matches)
+        terms = tokenize(query)
+        if not terms:
+            return [], 0
+        with self._lock:
+            total_scores = None
+            for term in dict.fromkeys(terms):
+                scores = self._term_scores(term)
+                if total_scores is None:
+                    total_scores = scores
+                else:
+                    total_scores = {k: s + scores[k] for k, s in total_scores.items() if k in scores}
+                if not total_scores:
+                    return [], 0
+            ranked = sorted(total_scores, key=lambda k: (-total_scores[k], self._order.get(k, 0)))
+        page = max(1, page)
+        start = (page - 1) * per_page
+        return ranked[start:start + per_page], len(ranked)
+
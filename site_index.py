@@ -0,0 +1,196 @@
+import math
+import threading
+import numpy as np
+
+
+def normalize_coords(lat, lon):
+    # Parse and validate a site's coordinates; returns (lat, lon) or None if unusable
+    try:
+        lat = float(lat)
+        lon = float(lon)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(lat) or math.isnan(lon):
+        return None
+    # If values look swapped (lat outside [-90,90] but lon inside), swap them
+    if (abs(lat) > 90 and abs(lon) <= 90) or (abs(lon) > 180) or (abs(lat) > 180 and abs(lon) <= 180):
+        lat, lon = lon, lat
+    # After potential swap, verify ranges
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def parse_bbox(value):
+    # "west,south,east,north" -> tuple of floats clamped to valid ranges, or None
+    if not value:
+        return None
+    try:
+        west, south, east, north = [float(v) for v in value.split(',')]
+    except ValueError:
+        return None
+    west, east = max(-180.0, min(west, east)), min(180.0, max(west, east))
+    south, north = max(-90.0, min(south, north)), min(90.0, max(south, north))
+    return west, south, east, north
+
+
+# Uniform grid index over site coordinates with per-zoom cluster buckets.
+# Buckets are computed once per (zoom, mineral) and reused until a site of that mineral
+# changes (copies keep them too), so a map request only touches the buckets inside its
+# viewport, and a miss for one mineral only reads that mineral's sites.
+class SiteIndex:
+    # Cluster radius in screen pixels and the zoom above which individual sites are returned
+    CLUSTER_RADIUS_PX = 60
+    MAX_CLUSTER_ZOOM = 12
+
+    def __init__(self, cell_size=1.0):
+        self.cell_size = float(cell_size)
+        self._cells = {}        # (row, col) -> {key: None}
+        self._points = {}       # key -> (lat, lon, mineral, payload)
+        self._by_mineral = {}   # mineral -> {key: None}
+        self._buckets = {}      # (zoom, mineral) -> bucket arrays, ('bounds', mineral) -> bounds
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def copy(self):
+        index = SiteIndex(self.cell_size)
+        with self._lock:
+            index._cells = {cell: dict(members) for cell, members in self._cells.items()}
+            index._points = dict(self._points)
+            index._by_mineral = {mineral: dict(keys) for mineral, keys in self._by_mineral.items()}
+            index._buckets = dict(self._buckets)  # never modified in place, so safe to share
+        return index
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size)))
+
+    def insert(self, key, lat, lon, mineral=None, payload=None):
+        with self._lock:
+            old = self._remove(key)
+            if old is not None:
+                self._invalidate(old[2])
+            self._points[key] = (lat, lon, mineral, payload)
+            self._cells.setdefault(self._cell(lat, lon), {})[key] = None
+            self._by_mineral.setdefault(mineral, {})[key] = None
+            self._invalidate(mineral)
+
+    def remove(self, key):
+        with self._lock:
+            point = self._remove(key)
+            if point is None:
+                return False
+            self._invalidate(point[2])
+            return True
+
+    def _remove(self, key):
+        point = self._points.pop(key, None)
+        if point is None:
+            return None
+        for index, group in ((self._cells, self._cell(point[0], point[1])), (self._by_mineral, point[2])):
+            members = index.get(group)
+            if members is not None:
+                members.pop(key, None)
+                if not members:
+                    del index[group]
+        return point
+
+    def _invalidate(self, mineral):
+        # Drop cached buckets/bounds covering this mineral (and the unfiltered ones)
+        for cache_key in [k for k in self._buckets if k[1] is None or k[1] == mineral]:
+            del self._buckets[cache_key]
+
+    def _keys(self, mineral):
+        return list(self._points) if mineral is None else list(self._by_mineral.get(mineral, ()))
+
+    def get(self, key):
+        point = self._points.get(key)
+        return None if point is None else point[3]
+
+    def query(self, bbox, mineral=None):
+        # Keys of sites inside bbox (west, south, east, north), optionally for one mineral
+        west, south, east, north = bbox
+        rmin, cmin = self._cell(south, west)
+        rmax, cmax = self._cell(north, east)
+        with self._lock:
+            span = (rmax - rmin + 1) * (cmax - cmin + 1)
+            if span <= len(self._cells):
+                cells = ((r, c) for r in range(rmin, rmax + 1) for c in range(cmin, cmax + 1))
+            else:
+                cells = (cell for cell in self._cells if rmin <= cell[0] <= rmax and cmin <= cell[1] <= cmax)
+            keys = []
+            for cell in list(cells):
+                for key in self._cells.get(cell, ()):
+                    lat, lon, site_mineral, _ = self._points[key]
+                    if mineral is not None and site_mineral != mineral:
+                        continue
+                    if south <= lat <= north and west <= lon <= east:
+                        keys.append(key)
+            return keys
+
+    def _cluster_buckets(self, zoom, mineral):
+        cache_key = (zoom, mineral)
+        buckets = self._buckets.get(cache_key)
+        if buckets is not None:
+            return buckets
+        keys = self._keys(mineral)
+        lat = np.fromiter((self._points[k][0] for k in keys), dtype=np.float64, count=len(keys))
+        lon = np.fromiter((self._points[k][1] for k in keys), dtype=np.float64, count=len(keys))
+        size = 360.0 * self.CLUSTER_RADIUS_PX / (256.0 * (2 ** zoom))
+        if len(keys):
+            cells = np.stack([np.floor(lat / size), np.floor(lon / size)], axis=1)
+            _, first, inverse = np.unique(cells, axis=0, return_index=True, return_inverse=True)
+            inverse = inverse.ravel()
+            counts = np.bincount(inverse)
+            buckets = {
+                'count': counts,
+                'lat': np.bincount(inverse, weights=lat) / counts,
+                'lon': np.bincount(inverse, weights=lon) / counts,
+                'first': [keys[i] for i in first],
+            }
+        else:
+            buckets = {'count': np.empty(0, dtype=np.int64), 'lat': np.empty(0), 'lon': np.empty(0), 'first': []}
+        self._buckets[cache_key] = buckets
+        return buckets
+
+    def clusters(self, zoom, bbox=None, mineral=None):
+        # Returns [(lat, lon, count, key_or_None)]; single-site buckets carry the site key
+        zoom = max(0, min(int(zoom), 22))
+        with self._lock:
+            if zoom > self.MAX_CLUSTER_ZOOM:
+                keys = self.query(bbox or (-180.0, -90.0, 180.0, 90.0), mineral)
+                return [(self._points[k][0], self._points[k][1], 1, k) for k in keys]
+            buckets = self._cluster_buckets(zoom, mineral)
+            mask = np.ones(len(buckets['count']), dtype=bool)
+            if bbox is not None:
+                west, south, east, north = bbox
+                mask &= (buckets['lat'] >= south) & (buckets['lat'] <= north)
+                mask &= (buckets['lon'] >= west) & (buckets['lon'] <= east)
+            out = []
+            for i in np.flatnonzero(mask):
+                count = int(buckets['count'][i])
+                key = buckets['first'][i]
+                if count == 1:
+                    lat, lon = self._points[key][0], self._points[key][1]
+                    out.append((lat, lon, 1, key))
+                else:
+                    out.append((float(buckets['lat'][i]), float(buckets['lon'][i]), count, None))
+            return out
+
+    def bounds(self, mineral=None):
+        # [[south, west], [north, east]] of indexed sites, or None when empty
+        with self._lock:
+            cache_key = ('bounds', mineral)
+            if cache_key not in self._buckets:
+                coords = [self._points[k][:2] for k in self._keys(mineral)]
+                if coords:
+                    lats = [c[0] for c in coords]
+                    lons = [c[1] for c in coords]
+                    self._buckets[cache_key] = [[min(lats), min(lons)], [max(lats), max(lons)]]
+                else:
+                    self._buckets[cache_key] = None
+            return self._buckets[cache_key]
@@ -0,0 +1,157 @@
+import threading
+
+from site_index import SiteIndex, normalize_coords
+from storage import _clean
+
+
+# One mining site. __slots__ keeps 100k+ records far smaller than dicts; get()/[] keep
+# the dict-style access used by templates, popups and exports working.
+class SiteRecord:
+    FIELDS = ('SiteID', 'SiteName', 'MineralID', 'CountryID', 'MineralName', 'CountryName',
+              'Latitude', 'Longitude', 'Production_tonnes')
+    __slots__ = FIELDS + ('mapped', 'extra')
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, _clean(values.pop(field, None)))
+        self.mapped = False
+        self.extra = {k: _clean(v) for k, v in values.items()} or None
+
+    def get(self, field, default=None):
+        if field in self.FIELDS:
+            value = getattr(self, field)
+        else:
+            value = (self.extra or {}).get(field)
+        return default if value is None else value
+
+    def __getitem__(self, field):
+        return self.get(field)
+
+    def __setitem__(self, field, value):
+        setattr(self, field, value)
+
+    def to_dict(self):
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self):
+        return f"<SiteRecord {self.SiteID} {self.SiteName!r}>"
+
+
+# Site registry with a primary key (SiteID) and secondary indexes by name, mineral and
+# country, plus the spatial index used by the map. Lookups, deletes and per-mineral
+# filters touch only the matching records, not the whole site list.
+class SiteRegistry:
+    def __init__(self):
+        self._by_id = {}          # SiteID -> record (insertion ordered)
+        self._by_name = {}        # SiteName -> {SiteID: None}
+        self._by_mineral = {}     # MineralName -> {SiteID: None}
+        self._by_country = {}     # CountryName -> {SiteID: None}
+        self._next_id = 1
+        self.spatial = SiteIndex()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_records(cls, rows):
+        registry = cls()
+        for row in rows:
+            registry.add(SiteRecord(**row))
+        return registry
+
+    def copy(self):
+        # Independent registry sharing the (replace-only) records
+        registry = SiteRegistry()
+        with self._lock:
+            registry._by_id = dict(self._by_id)
+            registry._by_name = {k: dict(v) for k, v in self._by_name.items()}
+            registry._by_mineral = {k: dict(v) for k, v in self._by_mineral.items()}
+            registry._by_country = {k: dict(v) for k, v in self._by_country.items()}
+            registry._next_id = self._next_id
+            registry.spatial = self.spatial.copy()
+        return registry
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    def __contains__(self, site_id):
+        return site_id in self._by_id
+
+    def next_id(self):
+        return self._next_id
+
+    def _link(self, index, key, site_id):
+        index.setdefault(key, {})[site_id] = None
+
+    def _unlink(self, index, key, site_id):
+        members = index.get(key)
+        if members is not None:
+            members.pop(site_id, None)
+            if not members:
+                del index[key]
+
+    def _place(self, record):
+        # Validate coordinates (fixing swapped lat/lon) and (re)insert into the spatial index
+        coords = normalize_coords(record.Latitude, record.Longitude)
+        if coords is None:
+            # Unusable coordinates stay in the registry but are not mapped
+            self.spatial.remove(record.SiteID)
+            record.mapped = False
+            return
+        record.Latitude, record.Longitude = coords
+        self.spatial.insert(record.SiteID, coords[0], coords[1], record.MineralName, record)
+        record.mapped = True
+
+    def add(self, record):
+        with self._lock:
+            if record.SiteID is None:
+                record.SiteID = self._next_id
+            record.SiteID = int(record.SiteID)
+            if record.SiteID in self._by_id:
+                self.remove(record.SiteID)
+            self._by_id[record.SiteID] = record
+            self._next_id = max(self._next_id, record.SiteID + 1)
+            self._link(self._by_name, record.SiteName, record.SiteID)
+            self._link(self._by_mineral, record.MineralName, record.SiteID)
+            self._link(self._by_country, record.CountryName, record.SiteID)
+            self._place(record)
+            return record
+
+    def remove(self, site_id):
+        with self._lock:
+            record = self._by_id.pop(site_id, None)
+            if record is None:
+                return None
+            self._unlink(self._by_name, record.SiteName, site_id)
+            self._unlink(self._by_mineral, record.MineralName, site_id)
+            self._unlink(self._by_country, record.CountryName, site_id)
+            self.spatial.remove(site_id)
+            return record
+
+    def update_coords(self, site_id, lat, lon):
+        # Replaces the record rather than editing it: copies of this registry share records
+        with self._lock:
+            record = self._by_id.get(site_id)
+            if record is None:
+                return None
+            return self.add(SiteRecord(**dict(record.to_dict(), Latitude=lat, Longitude=lon)))
+
+    def get(self, site_id):
+        return self._by_id.get(site_id)
+
+    def by_name(self, name):
+        # First site registered under this name (names are not guaranteed unique)
+        members = self._by_name.get(name)
+        if not members:
+            return None
+        return self._by_id[next(iter(members))]
+
+    def for_mineral(self, mineral_name):
+        return [self._by_id[i] for i in list(self._by_mineral.get(mineral_name, ()))]
+
+    def for_country(self, country_name):
+        return [self._by_id[i] for i in list(self._by_country.get(country_name, ()))]
@@ -0,0 +1,297 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+
+
+# Table layout: source CSVs (concatenated in order), primary key and secondary indexes.
+# Other columns are taken from the CSV headers so extra columns survive import/export.
+TABLES = {
+    'minerals': {'files': ['minerals.csv', 'extra_minerals.csv'], 'key': 'MineralID', 'indexes': ['MineralName']},
+    'countries': {'files': ['countries.csv'], 'key': 'CountryID', 'indexes': ['CountryName']},
+    'sites': {'files': ['sites.csv'], 'key': 'SiteID', 'indexes': ['SiteName', 'MineralID', 'CountryID']},
+    'production_stats': {'files': ['production_stats.csv'], 'key': 'StatID', 'indexes': ['MineralID, CountryID, Year', 'Year']},
+    'users': {'files': ['users.csv'], 'key': 'UserID', 'indexes': ['Username']},
+    'roles': {'files': ['roles.csv'], 'key': 'RoleID', 'indexes': []},
+}
+
+
+def _clean(value):
+    # pandas NaN/NumPy scalars -> plain Python values sqlite3 can bind
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value.item() if hasattr(value, 'item') else value
+
+
+def csv_fingerprint(data_dir, table):
+    # Cheap change detector for a table's source files: (mtime_ns, size) of each, '-' if missing
+    parts = []
+    for f in TABLES[table]['files']:
+        try:
+            st = os.stat(os.path.join(data_dir, f))
+            parts.append(f'{st.st_mtime_ns}:{st.st_size}')
+        except OSError:
+            parts.append('-')
+    return '|'.join(parts)
+
+
+def read_csv_table(data_dir, table):
+    # Concatenate a table's source CSVs (missing files are skipped)
+    frames = [pd.read_csv(os.path.join(data_dir, f)) for f in TABLES[table]['files'] if os.path.exists(os.path.join(data_dir, f))]
+    if not frames:
+        raise FileNotFoundError(f"no CSV files for table {table} in {data_dir}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def _write_csv(frame, path):
+    # Overwrite path with frame, keeping the existing file's header columns (plus any other
+    # column that has values) and its line endings
+    columns, newline = list(frame.columns), '\n'
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            first = f.readline()
+        header = pd.read_csv(path, nrows=0).columns
+        columns = [c for c in header if c in frame.columns] + [c for c in frame.columns if c not in header and frame[c].notna().any()]
+        newline = '\r\n' if first.endswith(b'\r\n') else '\n'
+    frame[columns].to_csv(path, index=False, lineterminator=newline)
+    return path
+
+
+# SQLite-backed store shared by all worker processes.
+# WAL mode lets readers run concurrently with a single writer; every write bumps
+# meta.data_version so workers can tell when their in-memory copy is stale.
+class SQLiteStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        conn.commit()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    # --- metadata / versioning ---------------------------------------------
+
+    def _get_meta(self, conn, key, default=None):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def _set_meta(self, conn, key, value):
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def _bump(self, conn, tables=None):
+        # Bump the global version and record it as the last-change version of each touched table
+        version = int(self._get_meta(conn, 'data_version', 0)) + 1
+        self._set_meta(conn, 'data_version', version)
+        for table in (TABLES if tables is None else tables):
+            self._set_meta(conn, f'table_version:{table}', version)
+        return version
+
+    def version(self):
+        return int(self._get_meta(self.connection(), 'data_version', 0))
+
+    def versions(self):
+        # (data_version, {table: version of its last change}) read in one consistent snapshot
+        rows = dict(self.connection().execute("SELECT key, value FROM meta WHERE key = 'data_version' OR key LIKE 'table_version:%'").fetchall())
+        tables = {key.split(':', 1)[1]: int(value) for key, value in rows.items() if key != 'data_version'}
+        return int(rows.get('data_version', 0)), tables
+
+    def csv_fingerprints(self):
+        # Fingerprint of each source CSV as last applied to the store
+        rows = self.connection().execute("SELECT key, value FROM meta WHERE key LIKE 'csv:%'").fetchall()
+        return {key.split(':', 1)[1]: value for key, value in rows}
+
+    def write(self, fn, tables=None):
+        # Run fn(conn) in one immediate transaction and bump the data version; returns (result, version)
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            version = self._bump(conn, tables)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return result, version
+
+    # --- bulk import / export ---------------------------------------------
+
+    def _replace_table(self, conn, table, frame):
+        spec = TABLES[table]
+        columns = list(frame.columns)
+        conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+        cols_sql = ', '.join(f'"{c}" INTEGER PRIMARY KEY' if c == spec['key'] else f'"{c}"' for c in columns)
+        conn.execute(f'CREATE TABLE "{table}" ({cols_sql})')
+        for i, index_cols in enumerate(spec['indexes']):
+            cols = ', '.join(f'"{c.strip()}"' for c in index_cols.split(','))
+            conn.execute(f'CREATE INDEX "ix_{table}_{i}" ON "{table}" ({cols})')
+        placeholders = ', '.join('?' for _ in columns)
+        quoted = ', '.join(f'"{c}"' for c in columns)
+        rows = ([_clean(v) for v in row] for row in frame.itertuples(index=False, name=None))
+        conn.executemany(f'INSERT OR REPLACE INTO "{table}" ({quoted}) VALUES ({placeholders})', rows)
+
+    def import_csvs(self, data_dir, force=False):
+        # Import data_dir/*.csv once; later workers (and restarts) reuse the database
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._get_meta(conn, 'imported') and not force:
+                conn.rollback()
+                return False
+            for table in TABLES:
+                try:
+                    frame = read_csv_table(data_dir, table)
+                except FileNotFoundError:
+                    continue
+                self._replace_table(conn, table, frame)
+            for table in TABLES:
+                self._set_meta(conn, f'csv:{table}', csv_fingerprint(data_dir, table))
+            self._set_meta(conn, 'imported', 1)
+            self._bump(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return True
+
+    def export_csvs(self, out_dir):
+        # Write each table back to its source CSVs. A table read from several files
+        # (minerals.csv + extra_minerals.csv) is split again: rows whose key is already listed
+        # in one of the later files in out_dir go back there, all others (new rows included)
+        # to the first file. Existing files keep their columns and line endings.
+        os.makedirs(out_dir, exist_ok=True)
+        written = []
+        for table, spec in TABLES.items():
+            if not self.has_table(table):
+                continue
+            frame = self.frame(table)
+            key = spec['key']
+            first, *later = spec['files']
+            claimed = pd.Series(False, index=frame.index)
+            for name in later:
+                path = os.path.join(out_dir, name)
+                if not os.path.exists(path):
+                    continue
+                listed = frame[key].isin(pd.read_csv(path, usecols=[key])[key]) & ~claimed
+                claimed |= listed
+                written.append(_write_csv(frame[listed], path))
+            written.append(_write_csv(frame[~claimed], os.path.join(out_dir, first)))
+        return written
+
+    # --- reads ------------------------------------------------------------
+
+    def has_table(self, table):
+        row = self.connection().execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        return row is not None
+
+    def frame(self, table):
+        key = TABLES[table]['key']
+        return pd.read_sql_query(f'SELECT * FROM "{table}" ORDER BY "{key}"', self.connection())
+
+    def columns(self, table):
+        return [row[1] for row in self.connection().execute(f'PRAGMA table_info("{table}")')]
+
+    # --- writes -----------------------------------------------------------
+
+    def insert(self, table, record):
+        columns = [c for c in record if c in self.columns(table)]
+        quoted = ', '.join(f'"{c}"' for c in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        return self.write(lambda conn: conn.execute(
+            f'INSERT INTO "{table}" ({quoted}) VALUES ({placeholders})', [_clean(record[c]) for c in columns]).lastrowid, [table])
+
+    def update(self, table, column, value, changes):
+        assignments = ', '.join(f'"{c}" = ?' for c in changes)
+        params = [_clean(v) for v in changes.values()] + [value]
+        return self.write(lambda conn: conn.execute(
+            f'UPDATE "{table}" SET {assignments} WHERE "{column}" = ?', params).rowcount, [table])
+
+    def delete(self, table, column, value):
+        return self.write(lambda conn: conn.execute(f'DELETE FROM "{table}" WHERE "{column}" = ?', (value,)).rowcount, [table])
+
+    def replace_table(self, table, frame):
+        return self.write(lambda conn: self._replace_table(conn, table, frame), [table])
+
+    def _upsert(self, conn, table, frame):
+        columns = [c for c in frame.columns if c in self.columns(table)]
+        quoted = ', '.join(f'"{c}"' for c in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        rows = [[_clean(v) for v in row] for row in frame[columns].itertuples(index=False, name=None)]
+        return conn.executemany(f'INSERT OR REPLACE INTO "{table}" ({quoted}) VALUES ({placeholders})', rows).rowcount
+
+    def apply_csv_delta(self, table, upserts, deleted, fingerprint):
+        # Apply a diffed CSV change (upserted rows + deleted keys) in one transaction.
+        # The CSV fingerprint is compared-and-set, so when several workers notice the
+        # same file change only the first one writes; returns the new version or None.
+        key = TABLES[table]['key']
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._get_meta(conn, f'csv:{table}') == fingerprint:
+                conn.rollback()
+                return None
+            self._set_meta(conn, f'csv:{table}', fingerprint)
+            if not len(upserts) and not len(deleted):
+                conn.commit()
+                return None
+            if not self.has_table(table):
+                self._replace_table(conn, table, upserts)
+            else:
+                if len(upserts):
+                    self._upsert(conn, table, upserts)
+                deleted = [_clean(k) for k in deleted]
+                for i in range(0, len(deleted), 500):
+                    chunk = deleted[i:i + 500]
+                    conn.execute(f'DELETE FROM "{table}" WHERE "{key}" IN ({", ".join("?" for _ in chunk)})', chunk)
+            version = self._bump(conn, [table])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return version
+
+
+def open_store(url):
+    # 'sqlite:///path/to.db' (or a bare path) -> SQLiteStore; 'none'/'' keeps the CSV-only in-memory mode
+    if not url or url.lower() in ('none', 'memory', 'csv'):
+        return None
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return SQLiteStore(url)
+
+
+if __name__ == '__main__':
+    import sys
+    # python storage.py import|export [data_dir] [--db path]
+    args = sys.argv[1:]
+    db = os.environ.get('DATA_STORE', 'data/minerals_app.db')
+    if '--db' in args:
+        i = args.index('--db')
+        db = args[i + 1]
+        del args[i:i + 2]
+    if not args or args[0] not in ('import', 'export'):
+        print("usage: python storage.py import|export [data_dir] [--db path]")
+        sys.exit(2)
+    store = open_store(db)
+    target = args[1] if len(args) > 1 else 'data'
+    if args[0] == 'import':
+        store.import_csvs(target, force=True)
+        print(f"Imported {target}/*.csv into {db} (version {store.version()})")
+    else:
+        for path in store.export_csvs(target):
+            print(f"Wrote {path}")
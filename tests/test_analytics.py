@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import Analytics, hhi, trend_forecast, yoy_growth
+from production_cube import ProductionCube
+
+
+def test_yoy_growth_skips_gaps_absent_years_and_zero_bases():
+    years = np.array([2019, 2020, 2021, 2023, 2024, 2025])
+    values = np.array([100.0, 110.0, 0.0, 50.0, 75.0, 80.0])
+    present = np.array([True, True, True, True, True, False])
+    growth = yoy_growth(years, values, present)
+    assert np.isnan(growth[0])                   # no prior year
+    assert growth[1] == pytest.approx(0.1)
+    assert growth[2] == pytest.approx(-1.0)
+    assert np.isnan(growth[3])                   # 2022 missing
+    assert growth[4] == pytest.approx(0.5)
+    assert np.isnan(growth[5])                   # 2025 has no data
+    zero_base = yoy_growth(np.array([2020, 2021]), np.array([0.0, 5.0]), np.array([True, True]))
+    assert np.isnan(zero_base[1])
+
+
+def test_yoy_growth_works_per_column():
+    years = np.array([2020, 2021])
+    values = np.array([[10.0, 4.0], [15.0, 2.0]])
+    growth = yoy_growth(years, values, np.ones_like(values, dtype=bool))
+    assert growth[1].tolist() == pytest.approx([0.5, -0.5])
+
+
+def test_trend_forecast_extends_a_linear_series():
+    years = np.array([2020, 2021, 2022, 2023])
+    values = np.array([10.0, 20.0, 30.0, 40.0])
+    future, forecast = trend_forecast(years, values, np.ones(4, dtype=bool), horizon=3)
+    assert future.tolist() == [2024, 2025, 2026]
+    assert forecast.tolist() == pytest.approx([50.0, 60.0, 70.0])
+
+
+def test_trend_forecast_uses_the_last_window_of_populated_years():
+    years = np.array([2018, 2019, 2020, 2021, 2022])
+    values = np.array([1000.0, 0.0, 10.0, 20.0, 30.0])
+    present = np.array([True, False, True, True, True])
+    _, forecast = trend_forecast(years, values, present, horizon=1, window=3)
+    assert forecast.tolist() == pytest.approx([40.0])
+
+
+def test_trend_forecast_needs_two_points_and_clips_at_zero():
+    years = np.array([2020, 2021, 2022])
+    values = np.array([[0.0, 30.0], [5.0, 10.0], [0.0, 0.0]])
+    present = np.array([[False, True], [True, True], [False, False]])
+    _, forecast = trend_forecast(years, values, present, horizon=2)
+    assert np.isnan(forecast[:, 0]).all()          # a single populated year
+    assert forecast[:, 1].tolist() == [0.0, 0.0]   # 30 -> 10 trends below zero
+
+
+def test_hhi():
+    values = np.array([[50.0, 50.0], [100.0, 0.0], [0.0, 0.0], [30.0, 10.0]])
+    index = hhi(values, axis=1)
+    assert index[0] == pytest.approx(5000)
+    assert index[1] == pytest.approx(10000)
+    assert np.isnan(index[2])
+    assert index[3] == pytest.approx((0.75 ** 2 + 0.25 ** 2) * 10000)
+
+
+@pytest.fixture
+def analytics():
+    rows = pd.DataFrame({
+        'Year':              [2022, 2022, 2023, 2023, 2023],
+        'MineralID':         [1, 1, 1, 1, 2],
+        'CountryID':         [10, 20, 10, 20, 10],
+        'Production_tonnes': [100.0, 100.0, 150.0, 50.0, 40.0],
+        'mineral': ['A', 'A', 'A', 'A', 'B'],
+        'country': ['X', 'Y', 'X', 'Y', 'X'],
+    })
+    minerals = {'A': {'MineralID': 1, 'MarketPriceUSD_per_tonne': 10}, 'B': {'MineralID': 2, 'MarketPriceUSD_per_tonne': 'n/a'}}
+    return Analytics(ProductionCube.from_frame(rows), minerals)
+
+
+def test_analytics_series_and_value(analytics):
+    years, series = analytics.series()
+    assert years.tolist() == [2022, 2023]
+    assert series['Production_tonnes'].tolist() == [200.0, 240.0]
+    # B has no usable price, so it adds tonnes but no value
+    assert series['ProductionValue_USD'].tolist() == [2000.0, 2000.0]
+    assert series['growth_tonnes'][1] == pytest.approx(0.2)
+    assert series['forecast_years'].tolist()[0] == 2024
+    assert series['forecast_tonnes'][0] == pytest.approx(280.0)
+
+    mi, ci = analytics.cube.resolve('A', 'X')
+    years, series = analytics.series(mi, ci)
+    assert series['Production_tonnes'].tolist() == [100.0, 150.0]
+    assert series['growth_value'][1] == pytest.approx(0.5)
+
+
+def test_analytics_concentration(analytics):
+    mi = analytics.cube.mineral_position('A')
+    years, values = analytics.concentration(mi)
+    assert years.tolist() == [2022, 2023]
+    assert values.tolist() == pytest.approx([5000, (0.75 ** 2 + 0.25 ** 2) * 10000])
+    # Without a mineral: concentration of production value across countries
+    _, values = analytics.concentration()
+    assert values[0] == pytest.approx(5000)
+
+
+def test_analytics_country_summary_uses_latest_year(analytics):
+    summary = analytics.country_summary['X']
+    assert summary['year'] == 2023
+    assert summary['production_tonnes'] == 190.0
+    assert summary['production_value_usd'] == 1500.0
+    assert summary['growth_tonnes'] == pytest.approx(0.9)
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import apply_table, build_snapshot, diff_frames, table_frame
+from production_cube import ProductionCube
+from storage import read_csv_table
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def snap():
+    return build_snapshot(lambda table: read_csv_table(ROOT, table))
+
+
+def test_diff_frames_reports_added_changed_and_deleted_rows():
+    old = pd.DataFrame({'ID': [1, 2, 3], 'Name': ['a', 'b', 'c'], 'Note': [np.nan, 'x', 'y']})
+    new = pd.DataFrame({'ID': [1, 2, 4], 'Name': ['a', 'B', 'd'], 'Note': [np.nan, 'x', 'z']})
+    delta = diff_frames(old, new, 'ID')
+    assert sorted(delta.upserts['ID']) == [2, 4]  # NaN == NaN, so row 1 is unchanged
+    assert delta.deleted == [3]
+    assert sorted(delta.previous.index) == [2, 3]
+    assert delta.previous.loc[2, 'Name'] == 'b'
+
+
+def test_diff_frames_of_identical_tables_is_empty():
+    frame = pd.DataFrame({'ID': [1, 2], 'Name': ['a', 'b']})
+    assert not diff_frames(frame, frame.copy(), 'ID')
+
+
+def test_apply_table_renames_a_mineral_everywhere(snap):
+    minerals = table_frame(snap, 'minerals')
+    minerals.loc[minerals['MineralName'] == 'Cobalt', 'MineralName'] = 'Cobalt (Co)'
+    new, delta = apply_table(snap, 'minerals', minerals)
+    assert len(delta.upserts) == 1 and not delta.deleted
+    assert 'Cobalt' not in new.minerals and 'Cobalt (Co)' in new.minerals
+    assert new.mineral_search.search('cobalt', 1, 10)[0] == ['Cobalt (Co)']
+    # Dependent production rows and sites carry the new name
+    assert new.production_cube.resolve('Cobalt (Co)', 'all') is not None
+    assert new.production_cube.resolve('Cobalt', 'all') is None
+    assert {site.MineralName for site in new.sites.for_mineral('Cobalt (Co)')} == {'Cobalt (Co)'}
+    # The published snapshot is left untouched
+    assert 'Cobalt' in snap.minerals and snap.production_cube.resolve('Cobalt', 'all') is not None
+
+
+def test_apply_table_deletes_production_rows_and_sites(snap):
+    stats = table_frame(snap, 'production_stats')
+    removed = stats.iloc[0]
+    new, delta = apply_table(snap, 'production_stats', stats.iloc[1:])
+    assert delta.deleted == [removed['StatID']]
+    assert len(new.df) == len(snap.df) - 1
+    assert new.production_cube.by_year['Production_tonnes'].sum() == pytest.approx(
+        snap.production_cube.by_year['Production_tonnes'].sum() - removed['Production_tonnes'])
+
+    sites = table_frame(snap, 'sites')
+    new, delta = apply_table(snap, 'sites', sites[sites['SiteName'] != 'Kolwezi Mine'])
+    assert len(delta.deleted) == 1
+    assert new.sites.by_name('Kolwezi Mine') is None and snap.sites.by_name('Kolwezi Mine') is not None
+
+
+def test_apply_table_updates_a_changed_production_row(snap):
+    stats = table_frame(snap, 'production_stats')
+    stats.loc[0, 'Production_tonnes'] += 1000
+    new, delta = apply_table(snap, 'production_stats', stats)
+    assert len(delta.upserts) == 1
+    mi, ci = new.production_cube.resolve(snap.df.loc[0, 'mineral'], snap.df.loc[0, 'country'])
+    _, yearly = new.production_cube.yearly(mi, ci)
+    _, before = snap.production_cube.yearly(mi, ci)
+    assert yearly['Production_tonnes'].sum() == before['Production_tonnes'].sum() + 1000
+
+
+def test_production_cube_add_then_remove_rows():
+    rows = pd.DataFrame({'Year': [2023, 2024, 2024], 'MineralID': [1, 1, 2], 'CountryID': [10, 10, 20],
+                         'Production_tonnes': [5.0, 7.0, 3.0], 'ExportValue_BillionUSD': [0.5, 0.7, 0.3],
+                         'mineral': ['A', 'A', 'B'], 'country': ['X', 'X', 'Y']})
+    cube = ProductionCube.from_frame(rows)
+    assert len(cube) == 3
+    years, yearly = cube.yearly()
+    assert years.tolist() == [2023, 2024]
+    assert yearly['Production_tonnes'].tolist() == [5.0, 10.0]
+    mi, ci = cube.resolve('A', 'X')
+    assert cube.yearly(mi, ci)[1]['Production_tonnes'].tolist() == [5.0, 7.0]
+
+    copy = cube.copy()
+    copy.remove_rows(rows.iloc[[1]])
+    assert len(copy) == 2 and len(cube) == 3
+    assert copy.yearly(mi, ci)[1]['Production_tonnes'].tolist() == [5.0]
+    names, totals = copy.share_by_mineral()
+    assert dict(zip(names, totals.tolist())) == {'A': 5.0, 'B': 3.0}
+
+    copy.remove_rows(rows.iloc[[0, 2]])
+    assert len(copy) == 0 and not copy.has_rows()
+    assert np.allclose(copy.by_year['Production_tonnes'], 0)
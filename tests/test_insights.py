@@ -0,0 +1,74 @@
+import pytest
+
+from insights import JsonlInsightLog, SQLiteInsightLog
+from storage import SQLiteStore
+
+TAIL = 5
+
+
+@pytest.fixture(params=['sqlite', 'jsonl'])
+def open_log(request, tmp_path):
+    # Opens a log handle (each one is like another worker) on the same backing file
+    if request.param == 'sqlite':
+        return lambda: SQLiteInsightLog(SQLiteStore(str(tmp_path / 'minerals_app.db')), tail_size=TAIL)
+    return lambda: JsonlInsightLog(str(tmp_path / 'insights.jsonl'), tail_size=TAIL)
+
+
+def fill(log, count=40):
+    # Mineral insights on subjects A/B/C (C is rare) by two users, with country ones interleaved
+    records = []
+    for i in range(count):
+        subject = 'C' if i % 10 == 3 else 'AB'[i % 2]
+        records.append(log.append('mineral', f'user{i % 2}', f'insight {i}', subject))
+        if i % 4 == 0:
+            log.append('country', 'user0', f'country insight {i}', 'X')
+    return records
+
+
+def all_pages(log, kind, limit, **filters):
+    # Follow the before cursors until the last page
+    pages, before = [], None
+    while True:
+        items, before = log.page(kind, before=before, limit=limit, **filters)
+        pages.append([r['insight'] for r in items])
+        if before is None:
+            return pages
+
+
+def expected(records, limit, subject=None, user=None):
+    texts = [r['insight'] for r in reversed(records)
+             if (subject is None or r['subject'] == subject) and (user is None or r['user'] == user)]
+    return [texts[i:i + limit] for i in range(0, len(texts), limit)] or [[]]
+
+
+@pytest.mark.parametrize('filters', [{}, {'subject': 'A'}, {'subject': 'C'}, {'user': 'user1'},
+                                     {'subject': 'B', 'user': 'user1'}, {'subject': 'missing'}])
+def test_pages_follow_cursors_past_the_tail(open_log, filters):
+    log = open_log()
+    records = fill(log)
+    assert all_pages(log, 'mineral', 3, **filters) == expected(records, 3, **filters)
+    # A fresh handle starts from the log with only the newest TAIL records in memory
+    assert all_pages(open_log(), 'mineral', 7, **filters) == expected(records, 7, **filters)
+
+
+def test_first_page_comes_from_the_tail_until_it_overflows(open_log):
+    log = open_log()
+    records = fill(log, 3)
+    items, cursor = log.page('mineral', limit=2)
+    assert [r['insight'] for r in items] == ['insight 2', 'insight 1'] and cursor == records[1]['id']
+    assert log.tail.page('mineral', 'C', None, None, 2) == []  # tail not full: "none" is trustworthy
+    fill(log, 10)
+    assert log.tail.page('mineral', 'missing', None, None, 2) is None  # overflowed: fall back to the log
+    items, cursor = log.page('mineral', subject='C', limit=2)
+    assert [r['insight'] for r in items] == ['insight 3'] and cursor is None
+
+
+def test_records_appended_by_another_worker_are_listed(open_log):
+    log, other = open_log(), open_log()
+    fill(log, 4)
+    record = other.append('mineral', 'user9', 'from the other worker', 'A')
+    items, _ = log.page('mineral', limit=1)
+    assert items[0]['id'] == record['id'] and items[0]['insight'] == 'from the other worker'
+    items, _ = log.page('mineral', user='user9')
+    assert [r['id'] for r in items] == [record['id']]
+    assert len({r['id'] for r in log.page('mineral', limit=50)[0]}) == 5  # ids stay unique
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+from render_pool import LaneFull, RenderPools, parse_lanes
+
+
+def hold(pools, lane, started, release):
+    # Occupy a slot of `lane` until release is set
+    def render():
+        started.release()
+        release.wait(5)
+    threading.Thread(target=pools.run, args=(lane, render), daemon=True).start()
+
+
+def test_full_lane_rejects_at_once():
+    pools = RenderPools(parse_lanes('charts=1,maps=1'))
+    started, release = threading.Semaphore(0), threading.Event()
+    hold(pools, 'charts', started, release)
+    assert started.acquire(timeout=5)
+    with pytest.raises(LaneFull):
+        pools.run('charts', lambda: None)
+    assert pools.run('maps', lambda: 'map') == 'map'
+    assert pools.lanes['charts'].rejected == 1
+    release.set()
+
+
+def test_size_for_caps_renders_across_lanes():
+    pools = RenderPools(parse_lanes('charts=2,maps=2'))
+    pools.size_for(4)  # two threads stay reserved
+    started, release = threading.Semaphore(0), threading.Event()
+    hold(pools, 'charts', started, release)
+    hold(pools, 'maps', started, release)
+    assert started.acquire(timeout=5) and started.acquire(timeout=5)
+    with pytest.raises(LaneFull):
+        pools.run('charts', lambda: None)
+    release.set()
+
+
+def test_nested_render_reuses_the_slot():
+    pools = RenderPools(parse_lanes('charts=1'))
+    assert pools.run('charts', lambda: pools.run('charts', lambda: 'inner')) == 'inner'
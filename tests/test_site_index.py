@@ -0,0 +1,33 @@
+from site_index import SiteIndex
+
+
+def build():
+    index = SiteIndex()
+    for key in range(40):
+        index.insert(key, -10.0 + key * 0.5, 20.0 + key * 0.25, 'A' if key % 2 else 'B')
+    return index
+
+
+def test_clusters_and_bounds_per_mineral():
+    index = build()
+    assert sum(count for _, _, count, _ in index.clusters(0)) == 40
+    assert sum(count for _, _, count, _ in index.clusters(0, mineral='A')) == 20
+    assert index.bounds('B') == [[-10.0, 20.0], [9.0, 29.5]]
+    assert index.bounds('C') is None and index.clusters(3, mineral='C') == []
+
+
+def test_copy_keeps_buckets_of_untouched_minerals():
+    index = build()
+    buckets = index._cluster_buckets(3, 'A')
+    index.bounds('A')
+    index.clusters(3, mineral='B')
+    copy = index.copy()
+    copy.insert(100, 0.0, 0.0, 'B')
+    assert copy._cluster_buckets(3, 'A') is buckets
+    assert ('bounds', 'A') in copy._buckets and (3, 'B') not in copy._buckets
+    assert sum(count for _, _, count, _ in copy.clusters(3, mineral='B')) == 21
+    # The original is unaffected
+    assert sum(count for _, _, count, _ in index.clusters(3, mineral='B')) == 20
+    copy.remove(1)
+    assert sum(count for _, _, count, _ in copy.clusters(3, mineral='A')) == 19
+    assert copy.bounds('A')[0] == [-8.5, 20.75]
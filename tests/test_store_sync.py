@@ -0,0 +1,123 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+from data_loader import apply_rows, build_snapshot, next_key
+from storage import SQLiteStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'minerals_app.db'))
+    store.import_csvs(ROOT)
+    return store
+
+
+def labels(snap):
+    # What the views show for each production label and site, independent of insertion order
+    cube = snap.production_cube
+    return {
+        'minerals': sorted(snap.minerals),
+        'countries': sorted(snap.countries),
+        'cube_minerals': dict(zip(cube.mineral_ids, cube.mineral_names)),
+        'cube_countries': dict(zip(cube.country_ids, cube.country_names)),
+        'sites': {site.SiteID: (site.SiteName, site.MineralName, site.CountryName, site.Latitude, site.Longitude)
+                  for site in snap.sites},
+    }
+
+
+def test_writer_snapshot_matches_a_fresh_load_after_deletes(store):
+    snap = build_snapshot(store.frame)
+    mineral_id = snap.minerals['Cobalt']['MineralID']
+    store.delete('minerals', 'MineralName', 'Cobalt')
+    snap = apply_rows(snap, 'minerals', deleted=[mineral_id])
+    country = next(iter(snap.countries))
+    store.delete('countries', 'CountryName', country)
+    snap = apply_rows(snap, 'countries', deleted=[snap.countries[country]['CountryID']])
+    fresh = build_snapshot(store.frame)
+    assert labels(snap) == labels(fresh)
+    # Dependent rows lose the label rather than keeping the deleted name
+    assert 'Cobalt' not in labels(snap)['cube_minerals'].values()
+    assert all(site.MineralName is None for site in snap.sites if site.MineralID == mineral_id)
+
+
+def test_writer_snapshot_matches_a_fresh_load_after_inserts_and_edits(store):
+    snap = build_snapshot(store.frame)
+    country_id, _ = store.insert('countries', {'CountryName': 'Testland', 'GDP_BillionUSD': 1.5})
+    snap = apply_rows(snap, 'countries', [{'CountryName': 'Testland', 'GDP_BillionUSD': 1.5, 'CountryID': country_id}])
+    site = {'SiteName': 'Test Pit', 'CountryID': country_id, 'MineralID': snap.minerals['Cobalt']['MineralID'],
+            'Latitude': 10.0, 'Longitude': 20.0, 'Production_tonnes': 5}
+    site_id, _ = store.insert('sites', site)
+    assert site_id == next_key(snap, 'sites')
+    snap = apply_rows(snap, 'sites', [dict(site, SiteID=site_id)])
+    moved = snap.sites.by_name('Kolwezi Mine')
+    store.update('sites', 'SiteID', moved.SiteID, {'Latitude': 1.0, 'Longitude': 2.0})
+    snap = apply_rows(snap, 'sites', [dict(moved.to_dict(), Latitude=1.0, Longitude=2.0)])
+    fresh = build_snapshot(store.frame)
+    assert labels(snap) == labels(fresh)
+    assert snap.sites.by_name('Test Pit').CountryName == 'Testland'
+    assert snap.country_search.search('testland', 1, 10)[0] == ['Testland']
+
+
+@pytest.fixture(scope='module')
+def worker(tmp_path_factory):
+    # The app module as one worker, on a copy of the data with its own SQLite store
+    work = tmp_path_factory.mktemp('worker')
+    os.makedirs(work / 'data')
+    for name in os.listdir(ROOT):
+        if name.endswith('.csv'):
+            shutil.copy(os.path.join(ROOT, name), work / 'data')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(work)
+        for name, value in {'DATA_STORE': str(work / 'data' / 'minerals_app.db'), 'DATA_SNAPSHOT': 'none',
+                            'DATA_WATCH_INTERVAL': '0', 'CHART_CACHE_WARMUP': '', 'PRELOAD_BACKENDS': ''}.items():
+            mp.setenv(name, value)
+        sys.modules.pop('app', None)
+        import app
+        yield app
+    sys.modules.pop('app', None)
+
+
+def test_sync_from_store_applies_another_workers_writes(worker):
+    other = SQLiteStore(worker.store.path)  # a second worker's handle on the same database
+    other.delete('minerals', 'MineralName', 'Lithium')
+    other.insert('countries', {'CountryName': 'Otherland', 'GDP_BillionUSD': 2.0})
+    other.update('sites', 'SiteName', 'Kolwezi Mine', {'Latitude': -5.0})
+    assert worker.current_snapshot().version != other.version()
+    worker.sync_from_store()
+    snap = worker.current_snapshot()
+    assert snap.version == other.version()
+    assert labels(snap) == labels(build_snapshot(other.frame))
+    assert 'Otherland' in snap.countries and 'Lithium' not in snap.minerals
+
+
+def test_save_change_catches_up_when_another_worker_wrote_in_between(worker):
+    other = SQLiteStore(worker.store.path)
+    worker.sync_from_store()
+    other.delete('sites', 'SiteName', 'Kolwezi Mine')
+    country = next(iter(worker.current_snapshot().countries))
+    country_id = worker.current_snapshot().countries[country]['CountryID']
+    worker.save_change(lambda st: st.delete('countries', 'CountryName', country),
+                       lambda snap, _: apply_rows(snap, 'countries', deleted=[country_id]))
+    snap = worker.current_snapshot()
+    # Both writes are in, through the store, at the store's version
+    assert snap.version == other.version()
+    assert country not in snap.countries and snap.sites.by_name('Kolwezi Mine') is None
+    assert labels(snap) == labels(build_snapshot(other.frame))
+
+
+def test_save_change_without_interleaving_applies_only_its_own_write(worker):
+    worker.sync_from_store()
+    before = worker.current_snapshot()
+    mineral = next(iter(before.minerals))
+    row = dict(before.minerals[mineral], MineralName=mineral, Description='Edited')
+    worker.save_change(lambda st: st.update('minerals', 'MineralName', mineral, {'Description': 'Edited'}),
+                       lambda snap, _: apply_rows(snap, 'minerals', [row]))
+    snap = worker.current_snapshot()
+    assert snap.version == worker.store.version() == before.version + 1
+    assert snap.minerals[mineral]['Description'] == 'Edited'
+    assert snap.sites is before.sites  # untouched tables are shared, not reloaded